@@ -0,0 +1,31 @@
+"""Add ranking indexes
+
+Revision ID: 0c6d2f8e4a19
+Revises: f27a5e9b3c81
+Create Date: 2026-10-18 15:02:44.218907
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6d2f8e4a19'
+down_revision: Union[str, None] = 'f27a5e9b3c81'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_ticket_snapshots_stakers_rank', 'ticket_snapshots',
+                    ['lottery_id', sa.text('delegation_tickets DESC'), 'address'], unique=False)
+    op.create_index('ix_ticket_snapshots_inviters_rank', 'ticket_snapshots',
+                    ['lottery_id', sa.text('referral_tickets DESC'), 'address'], unique=False,
+                    postgresql_where=sa.text('invited_count > 0'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ticket_snapshots_inviters_rank', table_name='ticket_snapshots')
+    op.drop_index('ix_ticket_snapshots_stakers_rank', table_name='ticket_snapshots')
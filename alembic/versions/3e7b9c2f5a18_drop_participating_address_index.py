@@ -0,0 +1,29 @@
+"""Drop the partial participating address index
+
+Revision ID: 3e7b9c2f5a18
+Revises: b58e2d0c7f36
+Create Date: 2026-10-18 18:02:41.336107
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3e7b9c2f5a18'
+down_revision: Union[str, None] = 'b58e2d0c7f36'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Address lookups already use the unique address index, and the participant scans read
+    # most of the table; the partial index only cost writes.
+    op.drop_index('ix_initial_delegators_participating', table_name='initial_delegators')
+
+
+def downgrade() -> None:
+    op.create_index('ix_initial_delegators_participating', 'initial_delegators', ['address'], unique=False,
+                    postgresql_where=sa.text('is_participate'))
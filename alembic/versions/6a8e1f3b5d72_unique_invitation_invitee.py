@@ -0,0 +1,33 @@
+"""Make invitations.invitee_id unique
+
+Revision ID: 6a8e1f3b5d72
+Revises: 0c6d2f8e4a19
+Create Date: 2026-10-18 16:11:37.580214
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6a8e1f3b5d72'
+down_revision: Union[str, None] = '0c6d2f8e4a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # An invitee can only have been invited once; keep the earliest invitation.
+    op.execute(
+        "DELETE FROM invitations a USING invitations b "
+        "WHERE a.invitee_id = b.invitee_id AND a.id > b.id"
+    )
+    op.drop_index(op.f('ix_invitations_invitee_id'), table_name='invitations')
+    op.create_index(op.f('ix_invitations_invitee_id'), 'invitations', ['invitee_id'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_invitations_invitee_id'), table_name='invitations')
+    op.create_index(op.f('ix_invitations_invitee_id'), 'invitations', ['invitee_id'], unique=False)
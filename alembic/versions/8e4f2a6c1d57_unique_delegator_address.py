@@ -0,0 +1,31 @@
+"""Unique delegator address
+
+Revision ID: 8e4f2a6c1d57
+Revises: 5b1e7c3d9a20
+Create Date: 2026-10-18 11:03:17.448210
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f2a6c1d57'
+down_revision: Union[str, None] = '5b1e7c3d9a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Keep only the newest row per address before enforcing uniqueness.
+    op.execute(
+        "DELETE FROM delegators a USING delegators b "
+        "WHERE a.address = b.address AND a.id < b.id"
+    )
+    op.create_index(op.f('ix_delegators_address'), 'delegators', ['address'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_delegators_address'), table_name='delegators')
@@ -0,0 +1,39 @@
+"""Add lottery ticket totals
+
+Revision ID: 9d3f5b7a1e24
+Revises: 6a8e1f3b5d72
+Create Date: 2026-10-18 16:48:02.913475
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d3f5b7a1e24'
+down_revision: Union[str, None] = '6a8e1f3b5d72'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('lotteries', sa.Column('total_tickets', sa.Integer(), nullable=True))
+    op.add_column('lotteries', sa.Column('participants_count', sa.Integer(), nullable=True))
+    op.add_column('lotteries', sa.Column('squared_tickets', sa.BigInteger(), nullable=True))
+    op.execute(
+        "UPDATE lotteries l SET total_tickets = t.total_tickets, participants_count = t.participants_count, "
+        "squared_tickets = t.squared_tickets "
+        "FROM (SELECT lottery_id, sum(total_tickets) AS total_tickets, "
+        "count(*) FILTER (WHERE total_tickets > 0) AS participants_count, "
+        "sum(total_tickets::bigint * total_tickets) AS squared_tickets "
+        "FROM ticket_snapshots GROUP BY lottery_id) t "
+        "WHERE t.lottery_id = l.id"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('lotteries', 'squared_tickets')
+    op.drop_column('lotteries', 'participants_count')
+    op.drop_column('lotteries', 'total_tickets')
@@ -0,0 +1,41 @@
+"""Add lookup indexes
+
+Revision ID: a3c9d0e7f412
+Revises: 8e4f2a6c1d57
+Create Date: 2026-10-18 12:21:09.734512
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a3c9d0e7f412'
+down_revision: Union[str, None] = '8e4f2a6c1d57'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_winners_lottery_id'), 'winners', ['lottery_id'], unique=False)
+    op.create_index(op.f('ix_winners_initial_delegator_id'), 'winners', ['initial_delegator_id'], unique=False)
+    op.create_index(op.f('ix_invitations_inviter_id'), 'invitations', ['inviter_id'], unique=False)
+    op.create_index(op.f('ix_invitations_invitee_id'), 'invitations', ['invitee_id'], unique=False)
+    op.create_index(op.f('ix_lotteries_is_finished'), 'lotteries', ['is_finished'], unique=False)
+    # Fails if more than one unfinished lottery exists; finish the stale ones first.
+    op.create_index('uq_lotteries_single_active', 'lotteries', ['is_finished'], unique=True,
+                    postgresql_where=sa.text('NOT is_finished'))
+    op.create_index('ix_initial_delegators_participating', 'initial_delegators', ['address'], unique=False,
+                    postgresql_where=sa.text('is_participate'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_initial_delegators_participating', table_name='initial_delegators')
+    op.drop_index('uq_lotteries_single_active', table_name='lotteries')
+    op.drop_index(op.f('ix_lotteries_is_finished'), table_name='lotteries')
+    op.drop_index(op.f('ix_invitations_invitee_id'), table_name='invitations')
+    op.drop_index(op.f('ix_invitations_inviter_id'), table_name='invitations')
+    op.drop_index(op.f('ix_winners_initial_delegator_id'), table_name='winners')
+    op.drop_index(op.f('ix_winners_lottery_id'), table_name='winners')
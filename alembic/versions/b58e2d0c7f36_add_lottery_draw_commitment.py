@@ -0,0 +1,32 @@
+"""Add lottery draw commitment
+
+Revision ID: b58e2d0c7f36
+Revises: 9d3f5b7a1e24
+Create Date: 2026-10-18 17:26:51.402688
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b58e2d0c7f36'
+down_revision: Union[str, None] = '9d3f5b7a1e24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('lotteries', sa.Column('draw_block_height', sa.Integer(), nullable=True))
+    op.add_column('lotteries', sa.Column('draw_seed', sa.String(), nullable=True))
+    op.add_column('lotteries', sa.Column('ledger_hash', sa.String(), nullable=True))
+    op.add_column('lotteries', sa.Column('draw_algorithm', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('lotteries', 'draw_algorithm')
+    op.drop_column('lotteries', 'ledger_hash')
+    op.drop_column('lotteries', 'draw_seed')
+    op.drop_column('lotteries', 'draw_block_height')
@@ -0,0 +1,35 @@
+"""Store winner ticket totals
+
+Revision ID: d41b8f07c6e3
+Revises: a3c9d0e7f412
+Create Date: 2026-10-18 13:02:44.180915
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b8f07c6e3'
+down_revision: Union[str, None] = 'a3c9d0e7f412'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('winners', sa.Column('total_tickets', sa.Integer(), nullable=True))
+    op.add_column('winners', sa.Column('amount_difference', sa.Integer(), nullable=True))
+    # Winners of lotteries drawn with a ticket snapshot get their totals from it.
+    op.execute(
+        "UPDATE winners w "
+        "SET total_tickets = s.total_tickets, amount_difference = s.amount - s.initial_amount "
+        "FROM initial_delegators i, ticket_snapshots s "
+        "WHERE i.id = w.initial_delegator_id AND s.lottery_id = w.lottery_id AND s.address = i.address"
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('winners', 'amount_difference')
+    op.drop_column('winners', 'total_tickets')
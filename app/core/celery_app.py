@@ -14,7 +14,11 @@ celery_app.conf.beat_schedule = {
     "fetch_delegators_hourly": {
         "task": "app.tasks.tasks.sync_delegators",
         "schedule": 3600,
-    }
+    },
+    "dispatch_lottery_schedule": {
+        "task": "app.tasks.tasks.dispatch_lottery_schedule",
+        "schedule": settings.LOTTERY_SCHEDULER_INTERVAL,
+    },
 }
 
 celery_app.conf.timezone = "UTC"
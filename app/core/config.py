@@ -11,6 +11,25 @@ class Settings(BaseSettings):
     POSTGRES_DB: str
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
+    VALIDATOR_ADDRESS: str = "cosmosvaloper106yp7zw35wftheyyv9f9pe69t8rteumjrx52jg"
+    DELEGATIONS_PAGE_SIZE: int = 500
+    GRPC_POOL_SIZE: int = 2
+    GRPC_MAX_IN_FLIGHT: int = 32
+    GRPC_TIMEOUT: float = 10.0
+    GRPC_KEEPALIVE_MS: int = 300_000
+    GRPC_KEEPALIVE_WITHOUT_CALLS: bool = False
+    DELEGATION_CACHE_TTL: int = 30
+    DELEGATION_CACHE_SIZE: int = 10_000
+    RESPONSE_CACHE_TTL: int = 3600
+    RESPONSE_CACHE_LOCK_TIMEOUT: int = 30
+    SIGNATURE_CACHE_SIZE: int = 10_000
+    PRIZE_PROBABILITY_EXACT_LIMIT: int = 200
+    # ~10 minutes of blocks between publishing the commitment and the seed block.
+    DRAW_SEED_BLOCK_OFFSET: int = 100
+    DRAW_SEED_TIMEOUT: float = 1200.0
+    LOTTERY_SYNC_LEAD: int = 600
+    LOTTERY_DRAW_RETRY: int = 1800
+    LOTTERY_SCHEDULER_INTERVAL: int = 60
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,4 @@
-import random
-import string
-
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, DateTime, func
+from sqlalchemy import BigInteger, Column, Integer, String, Boolean, ForeignKey, DateTime, Index, Text, func, text
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -10,7 +7,7 @@ class Delegator(Base):
     __tablename__ = "delegators"
 
     id = Column(Integer, primary_key=True, index=True)
-    address = Column(String, nullable=False)
+    address = Column(String, unique=True, nullable=False, index=True)
     amount = Column(Integer, nullable=False)
     timestamp = Column(DateTime, server_default=func.now())
 
@@ -21,19 +18,37 @@ class Lottery(Base):
     winners_count = Column(Integer, nullable=False)
     start_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, server_default=func.now())
-    is_finished = Column(Boolean, default=False)
+    is_finished = Column(Boolean, default=False, index=True)
     github_link = Column(String, nullable=True)
+    ticket_snapshot_at = Column(DateTime, nullable=True)
+    total_tickets = Column(Integer, nullable=True)
+    participants_count = Column(Integer, nullable=True)
+    squared_tickets = Column(BigInteger, nullable=True)
+    draw_block_height = Column(Integer, nullable=True)
+    draw_seed = Column(String, nullable=True)
+    ledger_hash = Column(String, nullable=True)
+    draw_algorithm = Column(String, nullable=True)
+    result_snapshot = Column(Text, nullable=True)
+    result_etag = Column(String, nullable=True)
+    result_is_final = Column(Boolean, default=False)
 
     winners = relationship("Winner", back_populates="lottery")
 
+    __table_args__ = (
+        Index("uq_lotteries_single_active", "is_finished", unique=True,
+              postgresql_where=text("NOT is_finished"), sqlite_where=text("NOT is_finished")),
+    )
+
 class Winner(Base):
     __tablename__ = "winners"
 
     id = Column(Integer, primary_key=True, index=True)
-    lottery_id = Column(Integer, ForeignKey("lotteries.id"), nullable=False)
-    initial_delegator_id = Column(Integer, ForeignKey("initial_delegators.id"), nullable=False)
+    lottery_id = Column(Integer, ForeignKey("lotteries.id"), nullable=False, index=True)
+    initial_delegator_id = Column(Integer, ForeignKey("initial_delegators.id"), nullable=False, index=True)
     is_main = Column(Boolean, default=False)
     is_claim_prize = Column(Boolean, default=False)
+    total_tickets = Column(Integer, nullable=True)
+    amount_difference = Column(Integer, nullable=True)
 
     lottery = relationship("Lottery", back_populates="winners")
     initial_delegator = relationship("InitialDelegator")
@@ -52,17 +67,35 @@ class InitialDelegator(Base):
     invited_by = relationship("Invitation", back_populates="inviter", foreign_keys="[Invitation.inviter_id]")
     invited_users = relationship("Invitation", back_populates="invitee", foreign_keys="[Invitation.invitee_id]")
 
-    @staticmethod
-    def generate_referral_token():
-        return "".join(random.choices(string.ascii_letters + string.digits, k=6))
-
 
 class Invitation(Base):
     __tablename__ = "invitations"
 
     id = Column(Integer, primary_key=True, index=True)
-    inviter_id = Column(Integer, ForeignKey("initial_delegators.id"), nullable=False)
-    invitee_id = Column(Integer, ForeignKey("initial_delegators.id"), nullable=False)
+    inviter_id = Column(Integer, ForeignKey("initial_delegators.id"), nullable=False, index=True)
+    invitee_id = Column(Integer, ForeignKey("initial_delegators.id"), nullable=False, unique=True, index=True)
 
     inviter = relationship("InitialDelegator", back_populates="invited_by", foreign_keys=[inviter_id])
     invitee = relationship("InitialDelegator", back_populates="invited_users", foreign_keys=[invitee_id])
+
+
+class TicketSnapshot(Base):
+    __tablename__ = "ticket_snapshots"
+
+    lottery_id = Column(Integer, ForeignKey("lotteries.id"), primary_key=True)
+    address = Column(String, primary_key=True)
+    initial_amount = Column(Integer, nullable=False, default=0)
+    amount = Column(Integer, nullable=False, default=0)
+    delegation_tickets = Column(Integer, nullable=False, default=0)
+    referral_tickets = Column(Integer, nullable=False, default=0)
+    invitee_tickets = Column(Integer, nullable=False, default=0)
+    total_tickets = Column(Integer, nullable=False, default=0)
+    invited_count = Column(Integer, nullable=False, default=0)
+    is_invitee = Column(Boolean, nullable=False, default=False)
+    updated_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_ticket_snapshots_stakers_rank", lottery_id, delegation_tickets.desc(), address),
+        Index("ix_ticket_snapshots_inviters_rank", lottery_id, referral_tickets.desc(), address,
+              postgresql_where=text("invited_count > 0"), sqlite_where=text("invited_count > 0")),
+    )
@@ -1,26 +1,36 @@
 # main.py
-import random
-from typing import List
+import json
+import uuid
+from typing import List, Optional
 
 import uvicorn
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette import status
 
 from app.core.celery_app import celery_app
 from app.core.dependencies import verify_token
 from app.db import models
-from app.db.database import get_db
+from app.db.database import SessionLocal, get_db, get_async_db
 from app.db.models import Lottery
 from app.schemas.initial_delegator import ParticipateRequest
-from app.schemas.lottery import LotteryCreate, LotteryResponse
+from app.schemas.lottery import LotteryCreate, LotteryResponse, TicketLedgerPage
 from app.services.claim_prizes_service import claim_prizes, get_address_prizes
-from app.services.delegator_service import get_invited_users, get_stakers_ranking
-from app.services.general import validate_signature
-from app.services.initial_delegator_service import participate, fetch_delegators_data, is_token_exist
-from app.services.invitation_service import get_invitation_ranking
-from app.services.lottery_service import create_lottery, get_lottery_info_by_address, \
-    get_addresses_participating_in_lottery, draw_lottery, get_lotteries_with_winners, process_lottery
+from app.services.delegator_service import get_invited_users, get_stakers_ranking, get_staker_rank
+from app.services.grpc_pool import async_chain_pool, chain_pool
+from app.services.idempotency import run_idempotent
+from app.services.initial_delegator_service import participate, claim_import, get_import_checkpoint, \
+    is_token_exist, release_import
+from app.services.invitation_service import get_invitation_ranking, get_inviter_rank
+from app.services.lottery_service import create_lottery_async, get_lottery_info_by_address_async, \
+    get_addresses_participating_in_lottery, get_lottery_history, process_lottery, get_frozen_lottery_result, \
+    iter_ticket_ledger, get_ticket_ledger_page, get_draw_commitment, verify_lottery_draw
+from app.services.response_cache import cached_json_response
+from app.services.signature import validate_signature
+from app.tasks.tasks import claim_lottery_draw, populate_initial_delegators, release_lottery_draw, \
+    run_lottery_draw
 
 app = FastAPI()
 
@@ -33,41 +43,66 @@ def read_root():
 def participate_endpoint(
         address: str,
         data: ParticipateRequest,
+        idempotency_key: Optional[str] = Header(None),
         db: Session = Depends(get_db)
 ):
     if not validate_signature(data.pubkey, data.signatures, address):
         raise HTTPException(status_code=400, detail="Invalid signature")
-    delegator = participate(db, address, data.referral_code)
-    return {"address": delegator.address, "is_participate": delegator.is_participate}
+
+    def register():
+        delegator = participate(db, address, data.referral_code)
+        return {"address": delegator.address, "is_participate": delegator.is_participate}
+
+    return run_idempotent(f"participate:{address}", idempotency_key, register)
 
 
 @app.post("/create_lottery")
 async def create_lottery_endpoint(lottery_data: LotteryCreate, db: Session = Depends(get_db),
                                   x_token: str = Depends(verify_token)):
-    new_lottery = create_lottery(lottery_data, db)
+    new_lottery = await create_lottery_async(lottery_data, db)
 
     return {"message": "Lottery created successfully", "lottery_id": new_lottery.id}
 
 @app.post("/populate-initial-delegators")
 def populate_delegators(db: Session = Depends(get_db)):
     delegators_count = db.query(models.InitialDelegator).count()
-    if delegators_count == 0:
-        fetch_delegators_data(db)
-        return {"message": "Delegators data populated"}
+    if delegators_count == 0 or get_import_checkpoint():
+        task_id = str(uuid.uuid4())
+        running = claim_import(task_id)
+        if running:
+            return {"message": "Delegators import is already running", "task_id": running}
+        try:
+            populate_initial_delegators.apply_async(task_id=task_id)
+        except Exception:
+            release_import(task_id)
+            raise
+        return {"message": "Delegators import started", "task_id": task_id}
     else:
         return {"message": "Delegators table is not empty. No action taken."}
 
+@app.get("/tasks/{task_id}")
+def get_task_status(task_id: str, token: str = Depends(verify_token)):
+    result = celery_app.AsyncResult(task_id)
+    response = {"task_id": task_id, "status": result.status}
+    if result.status == "PROGRESS":
+        response["progress"] = result.info
+    elif result.successful():
+        response["result"] = result.result
+    elif result.failed():
+        response["error"] = str(result.result)
+    return response
+
 @app.get("/lottery/current/{address}/info")
-async def get_lottery_info_api(address: str, db: Session = Depends(get_db)):
+async def get_lottery_info_api(address: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        lottery_info = get_lottery_info_by_address(address, db)
+        lottery_info = await get_lottery_info_by_address_async(address, db)
         return lottery_info
     except HTTPException as e:
         raise e
 
 
 @app.get("/lottery/participants")
-async def get_lottery_addresses(db: Session = Depends(get_db)):
+def get_lottery_addresses(db: Session = Depends(get_db)):
     try:
         addresses = get_addresses_participating_in_lottery(db)
         return {"addresses": addresses}
@@ -75,17 +110,57 @@ async def get_lottery_addresses(db: Session = Depends(get_db)):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/lottery/participants/tickets", response_model=TicketLedgerPage)
+def get_lottery_ticket_ledger(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    after: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    return get_ticket_ledger_page(db, offset, limit, after)
+
+
+@app.get("/lottery/participants/tickets.ndjson")
+def stream_lottery_ticket_ledger(
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    after: Optional[str] = None
+):
+    def lines():
+        # The request's session is closed before a streaming body is sent, so use our own.
+        db = SessionLocal()
+        try:
+            for row in iter_ticket_ledger(db, after, offset, limit):
+                yield json.dumps(row, separators=(",", ":")) + "\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.post("/draw_lottery", response_model=dict)
-async def draw_lottery_endpoint(
+def draw_lottery_endpoint(
     db: Session = Depends(get_db),
     token: str = Depends(verify_token)
 ):
+    lottery = db.query(Lottery).filter(Lottery.is_finished == False).first()
+    if not lottery:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No active lottery.")
+
+    task_id = str(uuid.uuid4())
+    running = claim_lottery_draw(lottery.id, task_id)
+    if running:
+        return {"message": "Lottery draw is already running", "task_id": running}
     try:
-        result = draw_lottery(db)
-        return result
+        run_lottery_draw.apply_async(task_id=task_id)
+    except Exception:
+        release_lottery_draw(lottery.id, task_id)
+        raise
+    return {"message": "Lottery draw started", "task_id": task_id}
 
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+@app.get("/metrics/grpc-pool")
+def grpc_pool_metrics(token: str = Depends(verify_token)):
+    return {"sync": chain_pool.metrics(), "async": async_chain_pool.metrics()}
 
 @app.post("/{address}/claim-prizes")
 def claim_prizes_endpoint(
@@ -103,28 +178,80 @@ def get_prizes(address: str, db: Session = Depends(get_db)):
     return get_address_prizes(db, address)
 
 @app.get("/address/{address}/invited")
-def invited_users(address: str, db: Session = Depends(get_db)):
-    return get_invited_users(address, db)
+def invited_users(
+    address: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    sort: str = Query("tickets", pattern="^(tickets|address)$"),
+    db: Session = Depends(get_db)
+):
+    return get_invited_users(address, db, offset, limit, sort)
 
 @app.get("/stakers/ranking")
-def stakers_ranking(db: Session = Depends(get_db)):
-    return get_stakers_ranking(db)
+def stakers_ranking(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    return cached_json_response(request, "stakers-ranking", {"offset": offset, "limit": limit},
+                                lambda: get_stakers_ranking(db, offset, limit))
+
+@app.get("/stakers/ranking/{address}")
+def staker_rank(
+    request: Request,
+    address: str,
+    neighbours: int = Query(5, ge=0, le=50),
+    db: Session = Depends(get_db)
+):
+    return cached_json_response(request, "staker-rank", {"address": address, "neighbours": neighbours},
+                                lambda: get_staker_rank(db, address, neighbours))
 
 @app.get("/inviters/ranking")
-def invitation_ranking(db: Session = Depends(get_db)):
-    return get_invitation_ranking(db)
+def invitation_ranking(
+    request: Request,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    return cached_json_response(request, "inviters-ranking", {"offset": offset, "limit": limit},
+                                lambda: get_invitation_ranking(db, offset, limit))
+
+@app.get("/inviters/ranking/{address}")
+def inviter_rank(
+    request: Request,
+    address: str,
+    neighbours: int = Query(5, ge=0, le=50),
+    db: Session = Depends(get_db)
+):
+    return cached_json_response(request, "inviter-rank", {"address": address, "neighbours": neighbours},
+                                lambda: get_inviter_rank(db, address, neighbours))
 
 @app.get("/check_referral_token/{referral_token}")
 def check_referral_token(referral_token: str, db: Session = Depends(get_db)):
     return {'is_exist': is_token_exist(referral_token, db)}
 
 @app.get("/lotteries", response_model=List[LotteryResponse])
-def get_lotteries(db: Session = Depends(get_db)):
-    lotteries = db.query(Lottery).all()
-    return lotteries
+def get_lotteries(
+    after_id: Optional[int] = Query(None, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    return get_lottery_history(db, after_id, limit)
+
+def lottery_result_response(request: Request, lottery: Lottery, db: Session, immutable: bool = True):
+    """Frozen lottery result with its ETag; ``immutable`` only for URLs that name the lottery."""
+    body, etag, is_final = get_frozen_lottery_result(db, lottery)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable" if is_final and immutable else "public, no-cache",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.get("/lotteries/last", response_model=LotteryResponse)
-def get_last_lottery(db: Session = Depends(get_db)):
+def get_last_lottery(request: Request, db: Session = Depends(get_db)):
     lottery = (
         db.query(Lottery)
         .filter(Lottery.is_finished == True)
@@ -134,7 +261,8 @@ def get_last_lottery(db: Session = Depends(get_db)):
     if not lottery:
         raise HTTPException(status_code=404, detail="No finished lottery found")
 
-    return process_lottery(lottery, db)
+    # /last moves to the next lottery after a draw, so it is always revalidated.
+    return lottery_result_response(request, lottery, db, immutable=False)
 
 
 @app.get("/lotteries/current", response_model=LotteryResponse)
@@ -147,12 +275,32 @@ def get_current_lottery(db: Session = Depends(get_db)):
 
 
 @app.get("/lotteries/{lottery_id}", response_model=LotteryResponse)
-def get_lottery(lottery_id: int, db: Session = Depends(get_db)):
+def get_lottery(lottery_id: int, request: Request, db: Session = Depends(get_db)):
     lottery = db.query(Lottery).filter(Lottery.id == lottery_id).first()
     if not lottery:
         raise HTTPException(status_code=404, detail="Lottery not found")
+    if not lottery.is_finished:
+        return process_lottery(lottery, db)
 
-    return process_lottery(lottery, db)
+    return lottery_result_response(request, lottery, db)
+
+
+@app.get("/lotteries/{lottery_id}/commitment")
+def get_lottery_commitment(lottery_id: int, include_ledger: bool = False, db: Session = Depends(get_db)):
+    lottery = db.query(Lottery).filter(Lottery.id == lottery_id).first()
+    if not lottery:
+        raise HTTPException(status_code=404, detail="Lottery not found")
+
+    return get_draw_commitment(db, lottery, include_ledger)
+
+
+@app.get("/lotteries/{lottery_id}/verify")
+def verify_lottery(lottery_id: int, include_ledger: bool = False, db: Session = Depends(get_db)):
+    lottery = db.query(Lottery).filter(Lottery.id == lottery_id).first()
+    if not lottery:
+        raise HTTPException(status_code=404, detail="Lottery not found")
+
+    return verify_lottery_draw(db, lottery, include_ledger)
 
 
 async def lifespan(app: FastAPI):
@@ -43,4 +43,19 @@ class LotteryResponse(BaseModel):
     winners: List[WinnerResponse] = []
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class TicketLedgerRow(BaseModel):
+    address: str
+    delegation_tickets: int
+    referral_tickets: int
+    invitee_tickets: int
+    total_tickets: int
+
+
+class TicketLedgerPage(BaseModel):
+    total: int
+    offset: int
+    limit: int
+    items: List[TicketLedgerRow] = []
+    next_after: Optional[str] = None
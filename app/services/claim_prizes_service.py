@@ -1,23 +1,35 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from app.db.models import InitialDelegator, Winner
+from app.services.lottery_service import freeze_lottery_result, lock_lottery
 
 def claim_prizes(db: Session, address: str):
     delegator = db.query(InitialDelegator).filter_by(address=address).first()
     if not delegator:
         raise HTTPException(status_code=404, detail="Address not found")
 
-    unclaimed_winners = (
+    unclaimed = (
         db.query(Winner)
         .filter_by(initial_delegator_id=delegator.id, is_claim_prize=False)
-        .all()
     )
 
+    # Lock the lotteries, in id order, before touching their winners so that concurrent
+    # claims neither claim twice nor freeze a result that misses the other's flags.
+    lottery_ids = sorted({winner.lottery_id for winner in unclaimed.all()})
+    lotteries = [lock_lottery(db, lottery_id) for lottery_id in lottery_ids]
+
+    unclaimed_winners = unclaimed.populate_existing().all()
     if not unclaimed_winners:
+        db.rollback()
         raise HTTPException(status_code=400, detail="You have no unclaimed prizes")
 
     for winner in unclaimed_winners:
         winner.is_claim_prize = True
+    db.flush()
+
+    for lottery in lotteries:
+        if lottery.result_snapshot:
+            freeze_lottery_result(db, lottery)
 
     db.commit()
 
@@ -1,49 +1,112 @@
+import io
+
 from fastapi import HTTPException
 from sqlalchemy.orm import Session, aliased
 
 from app.db.models import InitialDelegator, Invitation, Delegator
-from app.services.lottery_service import get_address_tickets
-from sqlalchemy import func
+from app.services.ticket_query import ranking_query, stacking_tickets_expr
+from app.services.ticket_snapshot_service import get_ranked_neighbours, get_ranked_rows, ticket_rows_subquery
+from sqlalchemy import text
+
+def get_invited_users(address: str, db: Session, offset: int = 0, limit: int = 100, sort: str = "tickets"):
+    inviter = aliased(InitialDelegator)
+    invitee = aliased(InitialDelegator)
+    tickets_expr = stacking_tickets_expr(Delegator.amount, invitee.amount)
+
+    query = (
+        db.query(invitee.address, tickets_expr.label("tickets"))
+        .select_from(Invitation)
+        .join(inviter, Invitation.inviter_id == inviter.id)
+        .join(invitee, Invitation.invitee_id == invitee.id)
+        .outerjoin(Delegator, Delegator.address == invitee.address)
+        .filter(inviter.address == address)
+    )
+    if sort == "tickets":
+        query = query.order_by(tickets_expr.desc(), invitee.address)
+    else:
+        query = query.order_by(invitee.address)
 
-def get_invited_users(address: str, db: Session):
-    delegator = db.query(InitialDelegator).filter_by(address=address).first()
-    if not delegator:
+    rows = query.offset(offset).limit(limit).all()
+    if not rows and not db.query(InitialDelegator.id).filter_by(address=address).first():
         raise HTTPException(status_code=404, detail="Address not found")
 
-    invited_users = db.query(Invitation).filter_by(inviter_id=delegator.id).all()
+    return [{"address": row.address, "tickets": row.tickets} for row in rows]
 
-    result = []
-    for invitation in invited_users:
-        invitee = db.query(InitialDelegator).filter_by(id=invitation.invitee_id).first()
-        if invitee:
-            tickets = get_address_tickets(invitee.address, db)
-            result.append({"address": invitee.address, "tickets": tickets})
-    return result
 
+def stakers_ranking_query(db: Session):
+    tickets = ticket_rows_subquery(db)
+    return ranking_query(
+        tickets,
+        tickets.c.delegation_tickets,
+        (tickets.c.amount - tickets.c.initial_amount).label("stake_diff"),
+        where=tickets.c.delegation_tickets > 0
+    )
 
-def get_stakers_ranking(db: Session):
-    delegators_alias = aliased(Delegator)
-    initial_delegators_alias = aliased(InitialDelegator)
 
-    difference_expr = delegators_alias.amount - initial_delegators_alias.amount
-    ticket_expr = difference_expr // 10
+def to_staker_row(row):
+    return {"position": row.position, "address": row.address, "tickets": row.tickets, "stake_diff": row.stake_diff}
 
-    ranking_query = (
-        db.query(
-            delegators_alias.address,
-            func.coalesce(ticket_expr, 0).label("tickets"),
-            func.coalesce(difference_expr, 0).label("difference")
-        )
-        .join(
-            initial_delegators_alias,
-            delegators_alias.address == initial_delegators_alias.address
+
+def get_stakers_ranking(db: Session, offset: int = 0, limit: int = None):
+    rows = get_ranked_rows(db, stakers_ranking_query(db), offset, limit)
+    return [to_staker_row(row) for row in rows]
+
+
+def get_staker_rank(db: Session, address: str, neighbours: int = 5):
+    rows = get_ranked_neighbours(db, stakers_ranking_query(db), address, neighbours)
+    entries = [to_staker_row(row) for row in rows]
+    entry = next((entry for entry in entries if entry["address"] == address), None)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Address is not ranked")
+
+    return {**entry, "neighbours": entries}
+
+
+def bulk_sync_delegators(db: Session, pages):
+    """Bring the delegators table in line with the chain using set-based statements.
+
+    Each page of delegations is COPY'd into a temporary staging table as it arrives, then
+    only new, changed and vanished addresses are written. Runs inside the caller's
+    transaction, so readers keep seeing the previous rows until it commits.
+    """
+    db.execute(text(
+        "CREATE TEMP TABLE delegators_staging (address varchar NOT NULL, amount numeric NOT NULL) "
+        "ON COMMIT DROP"
+    ))
+
+    staged = 0
+    with db.connection().connection.cursor() as cursor:
+        for page in pages:
+            buffer = io.StringIO()
+            for delegation in page.delegation_responses:
+                buffer.write(f"{delegation.delegation.delegator_address}\t{delegation.balance.amount}\n")
+            buffer.seek(0)
+            cursor.copy_expert("COPY delegators_staging (address, amount) FROM STDIN", buffer)
+            staged += cursor.rowcount
+
+    if not staged:
+        raise ValueError("No delegations fetched from the chain, refusing to empty delegators.")
+
+    db.execute(text("ANALYZE delegators_staging"))
+
+    inserted, updated = db.execute(text("""
+        WITH changed AS (
+            INSERT INTO delegators (address, amount)
+            SELECT DISTINCT ON (address) address, (amount / 1000000)::integer
+            FROM delegators_staging
+            ORDER BY address
+            ON CONFLICT (address) DO UPDATE
+                SET amount = EXCLUDED.amount, timestamp = now()
+                WHERE delegators.amount IS DISTINCT FROM EXCLUDED.amount
+            RETURNING (xmax = 0) AS is_inserted
         )
-        .filter(initial_delegators_alias.is_participate == True)
-        .filter(ticket_expr > 0)
-        .order_by(func.coalesce(ticket_expr, 0).desc())
-    ).all()
-
-    return [
-        {"position": index + 1, "address": row.address, "tickets": row.tickets, "stake_diff": row.difference}
-        for index, row in enumerate(ranking_query) if row.tickets > 0
-    ]
+        SELECT count(*) FILTER (WHERE is_inserted), count(*) FILTER (WHERE NOT is_inserted)
+        FROM changed
+    """)).one()
+
+    deleted = db.execute(text("""
+        DELETE FROM delegators d
+        WHERE NOT EXISTS (SELECT 1 FROM delegators_staging s WHERE s.address = d.address)
+    """)).rowcount
+
+    return {"fetched": staged, "inserted": inserted, "updated": updated, "deleted": deleted}
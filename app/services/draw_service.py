@@ -0,0 +1,124 @@
+import hashlib
+import heapq
+import math
+from collections import Counter
+from typing import Iterable, List, Tuple
+
+DRAW_ALGORITHM = "es-sha256-v1"
+
+
+def ledger_hash(ledger: Iterable[Tuple[str, int]]) -> str:
+    """SHA-256 over ``address:tickets`` lines of a ledger ordered by address."""
+    digest = hashlib.sha256()
+    for address, tickets in ledger:
+        digest.update(f"{address}:{tickets}\n".encode())
+    return digest.hexdigest()
+
+
+def seeded_uniform(seed: str, address: str) -> float:
+    """Uniform number in (0, 1] that only depends on the seed and the address."""
+    value = int.from_bytes(hashlib.sha256(f"{seed}:{address}".encode()).digest()[:8], "big")
+    return (value + 1) / 2 ** 64
+
+
+def pick_winners(ledger: Iterable[Tuple[str, int]], winners_count: int, seed: str) -> List[str]:
+    """Weighted sampling without replacement (Efraimidis–Spirakis), derived from ``seed``.
+
+    Every address gets the key ``log(u) / tickets`` with ``u`` from :func:`seeded_uniform`,
+    and the ``winners_count`` largest keys win, ordered by key. The resulting order has the
+    same distribution as shuffling the list with one entry per ticket and keeping the first
+    occurrence of every address, so the first winner is the main one. It does not depend on
+    the ledger order, so anyone holding the seed and the ledger can replay the draw in one
+    pass (``DRAW_ALGORITHM``).
+    """
+    if winners_count <= 0:
+        return []
+
+    keyed = (
+        (math.log(seeded_uniform(seed, address)) / tickets, address)
+        for address, tickets in ledger
+        if tickets > 0
+    )
+    return [address for _, address in heapq.nlargest(winners_count, keyed)]
+
+
+def exact_prize_probability(tickets: int, other_tickets: Iterable[int], winners_count: int,
+                            tolerance: float = 1e-7) -> float:
+    """Chance that an address holding ``tickets`` is among ``winners_count`` winners of :func:`pick_winners`.
+
+    Every holder's key is an exponential clock with its ticket count as the rate, and the
+    first ``winners_count`` clocks to fire win. With ``s = exp(-tickets * t)`` uniform on
+    (0, 1], another holder with ``w`` tickets fires before the address with probability
+    ``1 - s ** (w / tickets)``, and the answer is the integral over ``s`` of the chance that
+    fewer than ``winners_count`` of them did. Integrated with adaptive Simpson to
+    ``tolerance``; holders are grouped by ticket count, so every evaluation is
+    O(distinct ticket counts * winners_count ** 2).
+    """
+    if tickets <= 0 or winners_count <= 0:
+        return 0.0
+    holders = Counter(other for other in other_tickets if other > 0)
+    if sum(holders.values()) < winners_count:
+        return 1.0
+    groups = [(other / tickets, count) for other, count in holders.items()]
+
+    def not_overtaken(s: float) -> float:
+        # Probabilities of 0 .. winners_count - 1 holders firing first, one binomial per ticket count.
+        counts = [1.0] + [0.0] * (winners_count - 1)
+        for ratio, holders_count in groups:
+            fired = 1 - s ** ratio
+            if holders_count == 1:
+                for ahead in range(winners_count - 1, 0, -1):
+                    counts[ahead] = counts[ahead] * (1 - fired) + counts[ahead - 1] * fired
+                counts[0] *= 1 - fired
+                continue
+            binomial = [math.comb(holders_count, ahead) * fired ** ahead * (1 - fired) ** (holders_count - ahead)
+                        for ahead in range(min(holders_count, winners_count - 1) + 1)]
+            counts = [sum(counts[ahead - j] * binomial[j] for j in range(min(ahead, len(binomial) - 1) + 1))
+                      for ahead in range(winners_count)]
+        return sum(counts)
+
+    def integrate(a, fa, b, fb, m, fm, whole, tolerance, depth):
+        left_m, right_m = (a + m) / 2, (m + b) / 2
+        f_left, f_right = not_overtaken(left_m), not_overtaken(right_m)
+        left = (m - a) / 6 * (fa + 4 * f_left + fm)
+        right = (b - m) / 6 * (fm + 4 * f_right + fb)
+        if depth > 50 or (depth > 3 and abs(left + right - whole) <= 15 * tolerance):
+            return left + right + (left + right - whole) / 15
+        return (integrate(a, fa, m, fm, left_m, f_left, left, tolerance / 2, depth + 1)
+                + integrate(m, fm, b, fb, right_m, f_right, right, tolerance / 2, depth + 1))
+
+    f0, f1, fm = not_overtaken(0.0), not_overtaken(1.0), not_overtaken(0.5)
+    chance = integrate(0.0, f0, 1.0, f1, 0.5, fm, (f0 + 4 * fm + f1) / 6, tolerance, 0)
+    return min(max(chance, 0.0), 1.0)
+
+
+def prize_probability(tickets: int, total_tickets: int, squared_tickets: int,
+                      participants: int, winners_count: int) -> float:
+    """Estimated chance that an address holding ``tickets`` is among ``winners_count`` winners.
+
+    Winners are drawn one after another proportionally to tickets, without replacement.
+    Each draw among the other holders is assumed to remove their size-biased mean ticket
+    count (sum of squares over sum), so only the lottery aggregates are needed. Exact for a
+    single winner; for more it is a close estimate while winners are a small share of the
+    holders. O(winners_count).
+    """
+    if tickets <= 0 or total_tickets <= 0:
+        return 0.0
+    if participants <= winners_count:
+        return 1.0
+
+    others = total_tickets - tickets
+    others_squared = squared_tickets - tickets * tickets
+    others_count = participants - 1
+    miss = 1.0
+    for drawn in range(winners_count):
+        if drawn:
+            removed = max(min(others_squared / others, others - (others_count - 1)), 0)
+            others -= removed
+            others_count -= 1
+            if others_count > 0:
+                others_squared = max(others_squared - removed * removed, others * others / others_count)
+        if others <= 0 or others_count <= 0:
+            return 1.0
+        miss *= others / (tickets + others)
+    return 1 - miss
@@ -1,87 +1,165 @@
-import base64
-from hashlib import sha256
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import grpc
-from cosmpy.aerial.config import NetworkConfig
-from cosmpy.aerial.client import LedgerClient
-from cosmpy.crypto.keypairs import PublicKey
-from cosmpy.protos.cosmos.staking.v1beta1.query_pb2 import QueryDelegatorDelegationsRequest, \
-    QueryValidatorDelegationsRequest, QueryDelegationRequest
-from cosmpy.protos.cosmos.staking.v1beta1.query_pb2_grpc import QueryStub
-from cosmpy.protos.cosmos.base.query.v1beta1.pagination_pb2 import PageResponse, PageRequest
+import redis
+from cosmpy.aerial.client import LedgerClient  # noqa: F401 - loads protobuf before cosmpy.protos extends sys.path
+from cosmpy.protos.cosmos.base.tendermint.v1beta1.query_pb2 import GetBlockByHeightRequest, GetLatestBlockRequest
+from cosmpy.protos.cosmos.staking.v1beta1.query_pb2 import QueryValidatorDelegationsRequest, QueryDelegationRequest
+from cosmpy.protos.cosmos.base.query.v1beta1.pagination_pb2 import PageRequest
 
 from app.core.config import settings
+from app.core.redis import async_redis_client, redis_client
+from app.services.cache import MISSING, SingleFlight, TTLCache
+from app.services.grpc_pool import async_chain_pool, chain_pool
 
-def validate_signature(pubkey: str, signatures: str, address: str) -> bool:
-    msg = "i am in brottery"
+delegation_cache = TTLCache(maxsize=settings.DELEGATION_CACHE_SIZE, ttl=settings.DELEGATION_CACHE_TTL)
+delegation_flight = SingleFlight()
+delegation_tasks = {}
 
-    # Decode public key
-    pubkey_bytes = base64.b64decode(pubkey)
-    pubkey = PublicKey(pubkey_bytes)
+def get_latest_block_height() -> int:
+    res = chain_pool.call("tendermint", "GetLatestBlock", GetLatestBlockRequest())
+    return res.block.header.height
 
-    # Decode signature
-    signature = base64.b64decode(signatures)
 
-    # Hash the message
-    msg_hash = sha256(msg.encode()).digest()
+def wait_for_block_hash(height: int, timeout: float = None) -> str:
+    """Hex hash of the block at ``height``, waiting for the chain to produce it."""
+    deadline = time.monotonic() + (timeout or settings.DRAW_SEED_TIMEOUT)
+    while get_latest_block_height() < height:
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Block {height} was not produced in time")
+        time.sleep(1)
 
-    # Verify signature
-    is_valid = pubkey.verify(signature, msg_hash)
+    res = chain_pool.call("tendermint", "GetBlockByHeight", GetBlockByHeightRequest(height=height))
+    return res.block_id.hash.hex()
 
-    print("Signature is valid:", is_valid)
-    return True
 
+def iter_delegator_pages(page_size: int = None, height: int = None, start_key: bytes = b""):
+    """Yield ``ValidatorDelegations`` responses page by page.
 
-def get_delegators_from_cosmos():
-    cosmos_config = NetworkConfig(
-        chain_id="cosmoshub-4",
-        url=settings.GRPC_ADDRESS,
-        fee_minimum_gas_price=0.01,
-        fee_denomination="uatom",
-        staking_denomination="uatom",
-        faucet_url=None
-    )
+    The request for page N+1 is issued as soon as page N arrives, so the consumer can
+    write page N while the next one is in flight. ``height`` pins every page to the same
+    block so the result is a consistent view of the validator.
+    """
+    page_size = page_size or settings.DELEGATIONS_PAGE_SIZE
+    metadata = [("x-cosmos-block-height", str(height))] if height else None
 
-    client = LedgerClient(cosmos_config)
+    def fetch(key):
+        req = QueryValidatorDelegationsRequest(validator_addr=settings.VALIDATOR_ADDRESS,
+                                               pagination=PageRequest(limit=page_size, key=key))
+        return chain_pool.call("staking", "ValidatorDelegations", req, metadata=metadata)
 
-    latest_block = client.query_latest_block()
-    print("Latest Block:", latest_block)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(fetch, start_key)
+        while future:
+            page = future.result()
+            next_key = page.pagination.next_key
+            future = executor.submit(fetch, next_key) if next_key else None
+            yield page
 
-    channel = grpc.insecure_channel(settings.GRPC_ADDRESS)
-    QueryStub(channel)
 
-    validator_address = "cosmosvaloper106yp7zw35wftheyyv9f9pe69t8rteumjrx52jg"
+def get_delegator_info(delegator_address: str):
+    """Delegation of ``delegator_address`` to the validator, or None when it has none.
 
-    pagination = PageRequest(limit=500)
-    delegators = []
-    while True:
-        req = QueryValidatorDelegationsRequest(validator_addr=validator_address,
-                                               pagination=pagination)
-        res = client.staking.ValidatorDelegations(req)
-        delegators += res.delegation_responses
-        if len(res.pagination.next_key) == 0:
-            break
-        pagination = PageRequest(limit=500, key=res.pagination.next_key)
-    return delegators
+    Only a NOT_FOUND answer means there is no delegation; other errors are raised.
+    """
+    req = QueryDelegationRequest(delegator_addr=delegator_address, validator_addr=settings.VALIDATOR_ADDRESS)
+    try:
+        res = chain_pool.call("staking", "Delegation", req)
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.NOT_FOUND:
+            return None
+        raise
 
+    return res.delegation_response if res else None
 
-def get_delegator_info(delegator_address: str):
-    cosmos_config = NetworkConfig(
-        chain_id="cosmoshub-4",
-        url=settings.GRPC_ADDRESS,
-        fee_minimum_gas_price=0.01,
-        fee_denomination="uatom",
-        staking_denomination="uatom",
-        faucet_url=None
-    )
-
-    client = LedgerClient(cosmos_config)
-    validator_address = "cosmosvaloper106yp7zw35wftheyyv9f9pe69t8rteumjrx52jg"
-
-    req = QueryDelegationRequest(delegator_addr=delegator_address, validator_addr=validator_address)
+
+async def get_delegator_info_async(delegator_address: str):
+    req = QueryDelegationRequest(delegator_addr=delegator_address, validator_addr=settings.VALIDATOR_ADDRESS)
     try:
-        res = client.staking.Delegation(req)
+        res = await async_chain_pool.call("staking", "Delegation", req)
+    except grpc.RpcError as e:
+        if e.code() == grpc.StatusCode.NOT_FOUND:
+            return None
+        raise
+
+    return res.delegation_response if res else None
+
 
-        return res.delegation_response if res else None
-    except Exception as e:
-        return None
\ No newline at end of file
+def get_delegation_amount(delegator_address: str):
+    """Delegated uatom of ``delegator_address``, or None when it has no delegation.
+
+    Lookups go through an in-process LRU, then Redis, then the chain; concurrent misses
+    for the same address share a single chain query. A failed chain query also gives None,
+    but is not cached, so the next lookup asks the chain again.
+    """
+    amount = delegation_cache.get(delegator_address)
+    if amount is not MISSING:
+        return amount
+    return delegation_flight.do(delegator_address, lambda: _load_delegation_amount(delegator_address))
+
+
+def _load_delegation_amount(delegator_address: str):
+    key = f"delegation:{delegator_address}"
+    try:
+        cached = redis_client.get(key)
+    except redis.RedisError:
+        cached = None
+
+    if cached is not None:
+        amount = int(cached) if cached else None
+    else:
+        try:
+            delegation_info = get_delegator_info(delegator_address)
+        except (grpc.RpcError, TimeoutError) as e:
+            logging.warning(f"Delegation lookup of {delegator_address} failed: {e}")
+            return None
+        amount = int(delegation_info.balance.amount) if delegation_info else None
+        try:
+            redis_client.set(key, "" if amount is None else str(amount), ex=settings.DELEGATION_CACHE_TTL)
+        except redis.RedisError:
+            pass
+
+    delegation_cache.set(delegator_address, amount)
+    return amount
+
+
+async def get_delegation_amount_async(delegator_address: str):
+    """Async variant of :func:`get_delegation_amount` sharing the same cache tiers."""
+    amount = delegation_cache.get(delegator_address)
+    if amount is not MISSING:
+        return amount
+
+    task = delegation_tasks.get(delegator_address)
+    if task is None:
+        task = asyncio.ensure_future(_load_delegation_amount_async(delegator_address))
+        delegation_tasks[delegator_address] = task
+        task.add_done_callback(lambda _: delegation_tasks.pop(delegator_address, None))
+    return await asyncio.shield(task)
+
+
+async def _load_delegation_amount_async(delegator_address: str):
+    key = f"delegation:{delegator_address}"
+    try:
+        cached = await async_redis_client.get(key)
+    except redis.RedisError:
+        cached = None
+
+    if cached is not None:
+        amount = int(cached) if cached else None
+    else:
+        try:
+            delegation_info = await get_delegator_info_async(delegator_address)
+        except (grpc.RpcError, TimeoutError) as e:
+            logging.warning(f"Delegation lookup of {delegator_address} failed: {e}")
+            return None
+        amount = int(delegation_info.balance.amount) if delegation_info else None
+        try:
+            await async_redis_client.set(key, "" if amount is None else str(amount), ex=settings.DELEGATION_CACHE_TTL)
+        except redis.RedisError:
+            pass
+
+    delegation_cache.set(delegator_address, amount)
+    return amount
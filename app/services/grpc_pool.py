@@ -0,0 +1,257 @@
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+
+import certifi
+import grpc
+import grpc.aio
+from cosmpy.aerial.client import StakingGrpcClient, TendermintQueryGrpcClient
+from cosmpy.aerial.urls import parse_url
+
+from app.core.config import settings
+
+STUBS = {
+    "staking": StakingGrpcClient,
+    "tendermint": TendermintQueryGrpcClient,
+}
+
+
+def channel_options(keepalive_ms: int, keepalive_without_calls: bool = False):
+    # grpc-go servers (Cosmos nodes) by default answer pings more frequent than every
+    # 5 minutes, or any ping on an idle connection, with GOAWAY too_many_pings.
+    return [
+        ("grpc.keepalive_time_ms", keepalive_ms),
+        ("grpc.keepalive_timeout_ms", 10_000),
+        ("grpc.keepalive_permit_without_calls", int(keepalive_without_calls)),
+        ("grpc.use_local_subchannel_pool", 1),
+    ]
+
+
+def channel_credentials():
+    with open(certifi.where(), "rb") as f:
+        return grpc.ssl_channel_credentials(root_certificates=f.read())
+
+
+class ChainClientPool:
+    """Process-wide set of long-lived gRPC channels to the chain node.
+
+    Calls are spread round-robin over ``size`` channels, each with HTTP/2 keepalive, a
+    per-call deadline and at most ``max_in_flight`` concurrent RPCs for the whole pool.
+    Channels are rebuilt after a fork, so Celery prefork workers never share them.
+    """
+
+    def __init__(self, url: str, size: int, max_in_flight: int, timeout: float, keepalive_ms: int,
+                 keepalive_without_calls: bool = False):
+        self.url = url
+        self.size = size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.keepalive_ms = keepalive_ms
+        self.keepalive_without_calls = keepalive_without_calls
+
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_in_flight)
+        self._pid = None
+        self._channels = []
+        self._stubs = []
+        self._next = None
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "wait_seconds": 0.0,
+            "call_seconds": 0.0,
+        }
+
+    def _create_channel(self):
+        parsed_url = parse_url(self.url)
+        options = channel_options(self.keepalive_ms, self.keepalive_without_calls)
+        if parsed_url.secure:
+            return grpc.secure_channel(parsed_url.host_and_port, channel_credentials(), options=options)
+        return grpc.insecure_channel(parsed_url.host_and_port, options=options)
+
+    def _ensure_channels(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._channels = [self._create_channel() for _ in range(self.size)]
+            self._stubs = [
+                {name: stub(channel) for name, stub in STUBS.items()}
+                for channel in self._channels
+            ]
+            self._next = itertools.cycle(range(self.size))
+            self._pid = os.getpid()
+
+    def call(self, service: str, method: str, request, timeout: float = None, metadata=None):
+        self._ensure_channels()
+        timeout = timeout or self.timeout
+
+        started = time.monotonic()
+        if not self._semaphore.acquire(timeout=timeout):
+            with self._lock:
+                self._stats["rejected"] += 1
+            raise TimeoutError(f"gRPC pool is saturated ({self.max_in_flight} calls in flight)")
+
+        with self._lock:
+            stubs = self._stubs[next(self._next)]
+            self._stats["calls"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+            self._stats["wait_seconds"] += time.monotonic() - started
+
+        called = time.monotonic()
+        try:
+            return getattr(stubs[service], method)(request, timeout=timeout, metadata=metadata)
+        except grpc.RpcError:
+            with self._lock:
+                self._stats["failures"] += 1
+            raise
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+                self._stats["call_seconds"] += time.monotonic() - called
+            self._semaphore.release()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "channels": len(self._channels),
+                "max_in_flight": self.max_in_flight,
+                "timeout": self.timeout,
+                **self._stats,
+            }
+
+    def close(self):
+        with self._lock:
+            for channel in self._channels:
+                channel.close()
+            self._channels = []
+            self._stubs = []
+            self._pid = None
+
+
+class AsyncChainClientPool:
+    """``grpc.aio`` counterpart of :class:`ChainClientPool` for the async request path.
+
+    Channels are bound to the event loop that first uses them. If the loop changes, the old
+    channels are closed and new ones are built for the current loop.
+    """
+
+    def __init__(self, url: str, size: int, max_in_flight: int, timeout: float, keepalive_ms: int,
+                 keepalive_without_calls: bool = False):
+        self.url = url
+        self.size = size
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.keepalive_ms = keepalive_ms
+        self.keepalive_without_calls = keepalive_without_calls
+
+        self._loop = None
+        self._semaphore = None
+        self._channels = []
+        self._stubs = []
+        self._next = None
+        self._stats = {
+            "calls": 0,
+            "failures": 0,
+            "rejected": 0,
+            "in_flight": 0,
+            "peak_in_flight": 0,
+            "wait_seconds": 0.0,
+            "call_seconds": 0.0,
+        }
+
+    def _create_channel(self):
+        parsed_url = parse_url(self.url)
+        options = channel_options(self.keepalive_ms, self.keepalive_without_calls)
+        if parsed_url.secure:
+            return grpc.aio.secure_channel(parsed_url.host_and_port, channel_credentials(), options=options)
+        return grpc.aio.insecure_channel(parsed_url.host_and_port, options=options)
+
+    async def _ensure_channels(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        stale, self._channels = self._channels, []
+        for channel in stale:
+            try:
+                await channel.close()
+            except Exception as e:
+                logging.warning(f"Could not close a gRPC channel of a previous event loop: {e}")
+        self._channels = [self._create_channel() for _ in range(self.size)]
+        self._stubs = [
+            {name: stub(channel) for name, stub in STUBS.items()}
+            for channel in self._channels
+        ]
+        self._next = itertools.cycle(range(self.size))
+        self._semaphore = asyncio.Semaphore(self.max_in_flight)
+        self._loop = loop
+
+    async def call(self, service: str, method: str, request, timeout: float = None, metadata=None):
+        await self._ensure_channels()
+        timeout = timeout or self.timeout
+
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise TimeoutError(f"gRPC pool is saturated ({self.max_in_flight} calls in flight)")
+
+        stubs = self._stubs[next(self._next)]
+        self._stats["calls"] += 1
+        self._stats["in_flight"] += 1
+        self._stats["peak_in_flight"] = max(self._stats["peak_in_flight"], self._stats["in_flight"])
+        self._stats["wait_seconds"] += time.monotonic() - started
+
+        called = time.monotonic()
+        try:
+            return await getattr(stubs[service], method)(request, timeout=timeout, metadata=metadata)
+        except grpc.RpcError:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            self._stats["in_flight"] -= 1
+            self._stats["call_seconds"] += time.monotonic() - called
+            self._semaphore.release()
+
+    def metrics(self):
+        return {
+            "channels": len(self._channels),
+            "max_in_flight": self.max_in_flight,
+            "timeout": self.timeout,
+            **self._stats,
+        }
+
+    async def close(self):
+        for channel in self._channels:
+            await channel.close()
+        self._channels = []
+        self._stubs = []
+        self._loop = None
+
+
+chain_pool = ChainClientPool(
+    url=settings.GRPC_ADDRESS,
+    size=settings.GRPC_POOL_SIZE,
+    max_in_flight=settings.GRPC_MAX_IN_FLIGHT,
+    timeout=settings.GRPC_TIMEOUT,
+    keepalive_ms=settings.GRPC_KEEPALIVE_MS,
+    keepalive_without_calls=settings.GRPC_KEEPALIVE_WITHOUT_CALLS,
+)
+
+async_chain_pool = AsyncChainClientPool(
+    url=settings.GRPC_ADDRESS,
+    size=settings.GRPC_POOL_SIZE,
+    max_in_flight=settings.GRPC_MAX_IN_FLIGHT,
+    timeout=settings.GRPC_TIMEOUT,
+    keepalive_ms=settings.GRPC_KEEPALIVE_MS,
+    keepalive_without_calls=settings.GRPC_KEEPALIVE_WITHOUT_CALLS,
+)
@@ -0,0 +1,55 @@
+import json
+
+import redis
+from fastapi import HTTPException
+
+from app.core.redis import redis_client
+
+IDEMPOTENCY_TTL = 24 * 3600
+# Twice the request timeout: a worker that dies mid-request frees its key within a minute.
+IN_PROGRESS_TTL = 60
+IN_PROGRESS = b"in-progress"
+
+
+def run_idempotent(scope: str, key: str, fn):
+    """Run ``fn`` once per ``(scope, key)`` and replay its JSON result for repeated keys.
+
+    A key whose first request is still running is answered with 409. If ``fn`` raises,
+    the key is released so the request can be retried. The in-progress marker expires after
+    ``IN_PROGRESS_TTL``; only a stored result is kept for ``IDEMPOTENCY_TTL``.
+
+    Without Redis the key is ignored and ``fn`` runs, like a request without a key.
+    """
+    if not key:
+        return fn()
+
+    redis_key = f"idempotency:{scope}:{key}"
+    try:
+        claimed = redis_client.set(redis_key, IN_PROGRESS, nx=True, ex=IN_PROGRESS_TTL)
+        stored = None if claimed else redis_client.get(redis_key)
+    except redis.RedisError:
+        return fn()
+
+    if not claimed:
+        if stored is None or stored == IN_PROGRESS:
+            raise HTTPException(status_code=409, detail="A request with this idempotency key is in progress")
+        return json.loads(stored)
+
+    try:
+        result = fn()
+    except Exception:
+        forget(redis_key)
+        raise
+
+    try:
+        redis_client.set(redis_key, json.dumps(result), ex=IDEMPOTENCY_TTL)
+    except redis.RedisError:
+        forget(redis_key)
+    return result
+
+
+def forget(redis_key: str):
+    try:
+        redis_client.delete(redis_key)
+    except redis.RedisError:
+        pass
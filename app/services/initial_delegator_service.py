@@ -1,36 +1,76 @@
 import logging
 
 from fastapi import HTTPException
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
+from app.core.redis import redis_client
 from app.db import models
 from app.db.models import InitialDelegator, Invitation, Delegator
-from app.services.general import get_delegators_from_cosmos
+from app.services.general import get_latest_block_height, iter_delegator_pages
+from app.services.referral_tokens import referral_token_for
+from app.services.response_cache import bump_data_version
+from app.services.ticket_snapshot_service import refresh_ticket_snapshot
+
+IMPORT_CHECKPOINT_KEY = "initial_delegators_import"
+IMPORT_TASK_KEY = "initial_delegators_import:task"
+# Refreshed on every imported page, so only a dead worker lets it expire.
+IMPORT_LOCK_TTL = 600
+REFERRAL_TOKEN_TWEAKS = 8
+
+
+def assign_referral_token(db: Session, delegator: InitialDelegator):
+    """Derive the token from the row id, moving to the next tweak while the unique index rejects it.
+
+    A clash needs a legacy random token or a token derived with another tweak, so the
+    first tweak almost always fits.
+    """
+    db.flush()
+    for tweak in range(REFERRAL_TOKEN_TWEAKS):
+        try:
+            with db.begin_nested():
+                delegator.referral_token = referral_token_for(delegator.id, tweak=tweak)
+            return
+        except IntegrityError:
+            continue
+
+    raise HTTPException(status_code=500, detail="Could not assign a referral token")
 
 
 def participate(db: Session, address: str, referral_code: str = None):
-    delegator = db.query(InitialDelegator).filter_by(address=address).first()
+    """Register ``address`` as a participant in a single transaction.
+
+    The delegator row is created if needed and locked, so concurrent calls for the same
+    address are serialised and only the first one succeeds.
+    """
+    db.execute(
+        insert(InitialDelegator)
+        .values(address=address, amount=0, is_participate=False)
+        .on_conflict_do_nothing(index_elements=[InitialDelegator.address])
+    )
+    delegator = (
+        db.query(InitialDelegator)
+        .filter_by(address=address)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
 
-    if delegator and delegator.is_participate:
+    if delegator.is_participate:
+        db.rollback()
         raise HTTPException(status_code=403, detail="You are already participating")
-    elif delegator:
-        delegator.is_participate = True
-    else:
-        delegator = InitialDelegator(address=address, amount=0, is_participate=True)
-        db.add(delegator)
-        db.commit()
-        db.refresh(delegator)
-    while True:
-        new_token = InitialDelegator.generate_referral_token()
-        if not db.query(InitialDelegator).filter_by(referral_token=new_token).first():
-            break
-    delegator.referral_token = new_token
+    delegator.is_participate = True
+    assign_referral_token(db, delegator)
 
     if referral_code:
         inviter = db.query(InitialDelegator).filter_by(referral_token=referral_code).first()
         if inviter:
-            invitation = Invitation(inviter_id=inviter.id, invitee_id=delegator.id)
-            db.add(invitation)
+            db.execute(
+                insert(Invitation)
+                .values(inviter_id=inviter.id, invitee_id=delegator.id)
+                .on_conflict_do_nothing(index_elements=[Invitation.invitee_id])
+            )
             latest_delegator = (
                 db.query(Delegator)
                 .filter_by(address=address)
@@ -40,36 +80,94 @@ def participate(db: Session, address: str, referral_code: str = None):
             if latest_delegator:
                 delegator.amount = latest_delegator.amount
 
+    db.flush()
+    refresh_ticket_snapshot(db, address)
     db.commit()
-    db.refresh(delegator)
+    bump_data_version()
 
     return delegator
 
 
-def fetch_delegators_data(db: Session):
-    delegators = get_delegators_from_cosmos()
+def claim_import(task_id: str):
+    """Take the import lock for ``task_id``; returns the id of the task holding it, or None."""
+    while not redis_client.set(IMPORT_TASK_KEY, task_id, nx=True, ex=IMPORT_LOCK_TTL):
+        running = redis_client.get(IMPORT_TASK_KEY)
+        if running is not None:
+            running = running.decode()
+            return None if running == task_id else running
+    return None
 
-    for delegation in delegators:
-        delegator_address = delegation.delegation.delegator_address
-        amount = int(delegation.balance.amount) / 1_000_000
 
-        existing_delegator = db.query(models.InitialDelegator).filter(
-            models.InitialDelegator.address == delegator_address).first()
+def extend_import(task_id: str):
+    if redis_client.get(IMPORT_TASK_KEY) == task_id.encode():
+        redis_client.expire(IMPORT_TASK_KEY, IMPORT_LOCK_TTL)
 
-        if not existing_delegator:
-            logging.info("Creating new init delegator")
-            new_delegator = models.InitialDelegator(
-                address=delegator_address,
-                amount=amount,
-                is_participate=False
-            )
-            db.add(new_delegator)
-            db.commit()
-            db.refresh(new_delegator)
-        else:
-            logging.info(f"Delegator {delegator_address} already in db ")
-            existing_delegator.amount = amount
-            db.commit()
+
+def release_import(task_id: str):
+    if redis_client.get(IMPORT_TASK_KEY) == task_id.encode():
+        redis_client.delete(IMPORT_TASK_KEY)
+
+
+def get_import_checkpoint():
+    checkpoint = redis_client.hgetall(IMPORT_CHECKPOINT_KEY)
+    if not checkpoint:
+        return None
+    return {
+        "height": int(checkpoint[b"height"]),
+        "next_key": bytes.fromhex(checkpoint[b"next_key"].decode()),
+        "pages": int(checkpoint[b"pages"]),
+        "imported": int(checkpoint[b"imported"]),
+    }
+
+
+def save_import_checkpoint(progress: dict):
+    redis_client.hset(IMPORT_CHECKPOINT_KEY, mapping={**progress, "next_key": progress["next_key"].hex()})
+
+
+def upsert_initial_delegators(db: Session, rows):
+    stmt = insert(InitialDelegator).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[InitialDelegator.address],
+        set_={"amount": stmt.excluded.amount}
+    ))
+
+
+def fetch_delegators_data(db: Session, on_progress=None):
+    """Import the validator's delegators as initial delegators, one upsert per chain page.
+
+    Every page is committed together with a checkpoint of the next page key, so an
+    interrupted import resumes at the same block height where it stopped.
+    """
+    progress = get_import_checkpoint()
+    if progress:
+        logging.info(f"Resuming initial delegators import at page {progress['pages']}")
+    else:
+        progress = {"height": get_latest_block_height(), "next_key": b"", "pages": 0, "imported": 0}
+
+    for page in iter_delegator_pages(height=progress["height"], start_key=progress["next_key"]):
+        rows = [
+            {
+                "address": delegation.delegation.delegator_address,
+                "amount": (int(delegation.balance.amount) + 500_000) // 1_000_000,
+                "is_participate": False,
+            }
+            for delegation in page.delegation_responses
+        ]
+        if rows:
+            upsert_initial_delegators(db, rows)
+        db.commit()
+
+        progress["next_key"] = page.pagination.next_key
+        progress["pages"] += 1
+        progress["imported"] += len(rows)
+        save_import_checkpoint(progress)
+        if on_progress:
+            on_progress(progress)
+
+    redis_client.delete(IMPORT_CHECKPOINT_KEY)
+    bump_data_version()
+
+    return {"height": progress["height"], "pages": progress["pages"], "imported": progress["imported"]}
 
 
 def is_token_exist(referral_token: str, db: Session):
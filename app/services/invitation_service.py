@@ -5,23 +5,29 @@ from sqlalchemy.orm import Session
 
 from app.db import models
 from app.db.models import InitialDelegator, Invitation, Delegator
-from app.services.general import get_delegators_from_cosmos
-from app.services.lottery_service import get_invitations_dict, get_tickets_per_address
-
-
-def get_invitation_ranking(db: Session):
-    invitations_dict = get_invitations_dict(db)
-    tickets_per_address = get_tickets_per_address(db)
-
-    result = {}
-
-    for address, invitations in invitations_dict.items():
-        tickets = 0
-        for invitation in invitations:
-            tickets += tickets_per_address.get(invitation, 0)
-        result[address] = tickets
-    sorted_items = sorted(result.items(), key=lambda item: item[1], reverse=True)
-    return [
-        {"position": index + 1, "address": address, "tickets": tickets}
-        for index, (address, tickets) in enumerate(sorted_items)
-    ]
+from app.services.ticket_query import ranking_query
+from app.services.ticket_snapshot_service import get_ranked_neighbours, get_ranked_rows, ticket_rows_subquery
+
+
+def invitation_ranking_query(db: Session):
+    tickets = ticket_rows_subquery(db)
+    return ranking_query(tickets, tickets.c.referral_tickets, where=tickets.c.invited_count > 0)
+
+
+def to_inviter_row(row):
+    return {"position": row.position, "address": row.address, "tickets": row.tickets}
+
+
+def get_invitation_ranking(db: Session, offset: int = 0, limit: int = None):
+    rows = get_ranked_rows(db, invitation_ranking_query(db), offset, limit)
+    return [to_inviter_row(row) for row in rows]
+
+
+def get_inviter_rank(db: Session, address: str, neighbours: int = 5):
+    rows = get_ranked_neighbours(db, invitation_ranking_query(db), address, neighbours)
+    entries = [to_inviter_row(row) for row in rows]
+    entry = next((entry for entry in entries if entry["address"] == address), None)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Address is not ranked")
+
+    return {**entry, "neighbours": entries}
@@ -1,18 +1,37 @@
+import hashlib
 import logging
-import random
+from datetime import timedelta
+import httpx
 import requests
 
-from sqlalchemy.orm import Session, aliased
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
 from app.db import models
 from fastapi import HTTPException
-from sqlalchemy import func, delete
-
-from app.db.models import Invitation, Delegator, InitialDelegator, Lottery
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+
+from app.core.celery_app import celery_app
+from app.core.config import settings
+from app.db.models import Delegator, Lottery
 from app.schemas.lottery import LotteryResponse, WinnerResponse, InitialDelegatorResponse
-from app.services.general import get_delegator_info
+from app.services.draw_service import DRAW_ALGORITHM, exact_prize_probability, ledger_hash, pick_winners, \
+    prize_probability
+from app.services.cache import MISSING
+from app.services.general import get_delegation_amount, get_delegation_amount_async, get_latest_block_height, \
+    wait_for_block_hash
+from app.services.response_cache import bump_data_version
+from app.services.ticket_snapshot_service import get_ticket_rows, get_lottery_ticket_rows, get_ticket_totals, \
+    lock_snapshot, rebuild_ticket_snapshot, refresh_ticket_snapshot, compute_ticket_rows, snapshot_to_dict, \
+    ticket_rows_subquery
 
+LEDGER_BATCH_SIZE = 1000
 
-def create_lottery(lottery_data, db: Session):
+
+def check_no_active_lottery(db: Session):
     existing_lottery = db.query(models.Lottery).filter(models.Lottery.is_finished == False).first()
     if existing_lottery:
         raise HTTPException(
@@ -20,142 +39,148 @@ def create_lottery(lottery_data, db: Session):
             detail="There is already an active lottery"
         )
 
-    link = lottery_data.github_link
-    if link:
-        try:
-            response = requests.get(link)
-            response.raise_for_status()
-            data = response.json()
-            if isinstance(data, list):
-                winners_count = len(data)
-            else:
-                raise HTTPException(status_code=400, detail="Invalid JSON format. Expected a list.")
-        except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Error fetching or parsing JSON: {str(e)}")
-    else:
-        raise HTTPException(status_code=400, detail=f"Github link is required")
+def get_winners_count(data):
+    if isinstance(data, list):
+        return len(data)
+    raise HTTPException(status_code=400, detail="Invalid JSON format. Expected a list.")
+
+def schedule_lottery(lottery: Lottery):
+    """Queue the pre-draw sync and the draw for the lottery's start; beat retries them if this fails."""
+    sync_at = lottery.start_at - timedelta(seconds=settings.LOTTERY_SYNC_LEAD)
+    try:
+        for eta in (sync_at, lottery.start_at):
+            celery_app.send_task("app.tasks.tasks.dispatch_lottery_schedule", eta=eta)
+    except Exception as e:
+        logging.warning(f"Could not schedule lottery {lottery.id}: {e}")
+
 
+def save_lottery(lottery_data, winners_count: int, db: Session):
     new_lottery = models.Lottery(
         winners_count=winners_count,
         start_at=lottery_data.start_at,
-        github_link=link,
+        github_link=lottery_data.github_link,
         is_finished=False
     )
 
     db.add(new_lottery)
+    try:
+        db.flush()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="There is already an active lottery")
+    rebuild_ticket_snapshot(db, new_lottery)
     db.commit()
+    bump_data_version()
+    schedule_lottery(new_lottery)
     db.refresh(new_lottery)
 
     return new_lottery
 
+def create_lottery(lottery_data, db: Session):
+    check_no_active_lottery(db)
+
+    link = lottery_data.github_link
+    if link:
+        try:
+            response = requests.get(link)
+            response.raise_for_status()
+            winners_count = get_winners_count(response.json())
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error fetching or parsing JSON: {str(e)}")
+    else:
+        raise HTTPException(status_code=400, detail="Github link is required")
+
+    return save_lottery(lottery_data, winners_count, db)
+
+async def create_lottery_async(lottery_data, db: Session):
+    await run_in_threadpool(check_no_active_lottery, db)
+
+    link = lottery_data.github_link
+    if link:
+        try:
+            async with httpx.AsyncClient(follow_redirects=True) as client:
+                response = await client.get(link)
+            response.raise_for_status()
+            winners_count = get_winners_count(response.json())
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error fetching or parsing JSON: {str(e)}")
+    else:
+        raise HTTPException(status_code=400, detail="Github link is required")
+
+    return await run_in_threadpool(save_lottery, lottery_data, winners_count, db)
+
 def get_active_lottery(db: Session):
     active_lottery = db.query(models.Lottery).filter(models.Lottery.is_finished == False).first()
     return active_lottery
 
-def get_initial_delegator(address: str, db: Session):
-    initial_delegator = db.query(models.InitialDelegator).filter(models.InitialDelegator.address == address).first()
+def check_participates(initial_delegator):
     if not initial_delegator or not initial_delegator.is_participate:
         raise HTTPException(status_code=400, detail="You don't take part in lotteries")
     return initial_delegator
 
+def get_initial_delegator(address: str, db: Session):
+    initial_delegator = db.query(models.InitialDelegator).filter(models.InitialDelegator.address == address).first()
+    return check_participates(initial_delegator)
+
+async def get_initial_delegator_async(address: str, db: AsyncSession):
+    initial_delegator = await db.scalar(
+        select(models.InitialDelegator).where(models.InitialDelegator.address == address)
+    )
+    return check_participates(initial_delegator)
+
 def get_latest_delegator(address: str, db: Session):
-    delegator = db.query(models.Delegator).filter(models.Delegator.address == address).first()
+    # populate_existing: the re-read after an upsert must not return the stale instance
+    # of a session that does not expire on commit.
+    delegator = db.query(models.Delegator).filter(models.Delegator.address == address).populate_existing().first()
     if not delegator:
         return models.Delegator(address=address, amount=0, timestamp=func.now())
     return delegator
 
-def update_delegator_info(db: Session, delegator: Delegator):
-    delegation_info = get_delegator_info(delegator.address)
+def update_delegator_info(db: Session, delegator: Delegator, delegated=MISSING):
+    if delegated is MISSING:
+        delegated = get_delegation_amount(delegator.address)
 
-    if not delegation_info:
+    if delegated is None:
         return delegator
 
-    db.execute(delete(Delegator).where(Delegator.address == delegator.address))
-
-    new_delegator = Delegator(
-        address=delegator.address,
-        amount=int(delegation_info.balance.amount) / 1_000_000,
-    )
-
-    db.add(new_delegator)
-    db.commit()
-    db.refresh(new_delegator)
-
-    return new_delegator
-
-def calculate_stacking_tickets(delegator_amount: int, initial_delegator_amount: int):
-    return (max(delegator_amount - initial_delegator_amount, 0)) // 10
-
-
-def get_total_stacking_tickets(db: Session):
-    delegators_alias = aliased(models.Delegator)
-    initial_delegators_alias = aliased(models.InitialDelegator)
+    amount = (delegated + 500_000) // 1_000_000
+    if delegator.id is not None and delegator.amount == amount:
+        return delegator
 
-    total_tickets = (
-        db.query(
-            func.sum((delegators_alias.amount - initial_delegators_alias.amount) // 10)
-        )
-        .join(
-            initial_delegators_alias,
-            delegators_alias.address == initial_delegators_alias.address,
-            isouter=False
+    db.execute(
+        insert(Delegator)
+        .values(address=delegator.address, amount=amount)
+        .on_conflict_do_update(
+            index_elements=[Delegator.address],
+            set_={"amount": amount, "timestamp": func.now()}
         )
-        .filter(initial_delegators_alias.is_participate == True)
-        .filter(delegators_alias.amount - initial_delegators_alias.amount > 0)
-        .scalar()
     )
+    refresh_ticket_snapshot(db, delegator.address)
+    db.commit()
+    bump_data_version()
 
-    return total_tickets or 0
-
-
-def get_address_tickets(address: str, db: Session):
-    initial_delegator = get_initial_delegator(address, db)
-
-    delegator = get_latest_delegator(address, db)
-
-    return calculate_stacking_tickets(delegator.amount, initial_delegator.amount)
-
-def get_invitation_tickets(address, ticket_per_address, invitations_dict):
-    result = 0
-    if address_invitations := invitations_dict.get(address, None):
-        for item in address_invitations:
-            result += ticket_per_address.get(item, 0)
-    return result
-
-
-def get_total_invitation_tickets(ticket_per_address, invitations_dict):
-    result = 0
-    for _, invitees in invitations_dict.items():
-        for address in invitees:
-            result += ticket_per_address.get(address, 0)
-    return result
-
+    return get_latest_delegator(delegator.address, db)
 
-def get_invitee_tickets(address, stacking_tickets, invitations_dict):
-    if any(address in values for values in invitations_dict.values()) and stacking_tickets > 0:
-        return 1
-    else:
-        return 0
-
-def get_lottery_info_by_address(address: str, db: Session):
+def get_lottery_info_by_address(address: str, db: Session, delegated=MISSING, initial_delegator=None):
     active_lottery = get_active_lottery(db)
 
-    initial_delegator = get_initial_delegator(address, db)
+    if initial_delegator is None:
+        initial_delegator = get_initial_delegator(address, db)
 
     delegator = get_latest_delegator(address, db)
-    delegator = update_delegator_info(db, delegator)
-    stacking_tickets = calculate_stacking_tickets(delegator.amount, initial_delegator.amount)
-    total_stacking_tickets = get_total_stacking_tickets(db)
-
-    ticket_per_address = get_tickets_per_address(db)
-    invitations_dict = get_invitations_dict(db)
+    delegator = update_delegator_info(db, delegator, delegated)
 
-    invitation_tickets = get_invitation_tickets(address, ticket_per_address, invitations_dict)
-    total_invitation_tickets = get_total_invitation_tickets(ticket_per_address, invitations_dict)
-    total_tickets = total_invitation_tickets + total_stacking_tickets
-    invitee_tickets = get_invitee_tickets(address, stacking_tickets, invitations_dict)
+    address_rows = get_ticket_rows(db, [address])
+    row = address_rows[0] if address_rows else {}
+    stacking_tickets = row.get("delegation_tickets", 0)
+    invitation_tickets = row.get("referral_tickets", 0)
+    invitee_tickets = row.get("invitee_tickets", 0)
     tickets = stacking_tickets + invitation_tickets + invitee_tickets
-    win_probability = tickets / len(get_addresses_participating_in_lottery(db)) if total_tickets else 0
+
+    totals = get_ticket_totals(db)
+    winners_count = active_lottery.winners_count if active_lottery else 1
+    win_probability = tickets / totals["total_tickets"] if totals["total_tickets"] else 0
+    prize_chance, prize_is_estimate = get_prize_probability(db, address, tickets, totals, winners_count)
 
     result =  {
         "address_info": {
@@ -169,6 +194,8 @@ def get_lottery_info_by_address(address: str, db: Session):
             "referral_tickets": invitation_tickets,
             "invitee_tickets": invitee_tickets,
             "win_probability": win_probability,
+            "prize_probability": prize_chance,
+            "prize_probability_is_estimate": prize_is_estimate,
         }
     }
     if active_lottery:
@@ -179,206 +206,249 @@ def get_lottery_info_by_address(address: str, db: Session):
         }
     return result
 
+def get_prize_probability(db: Session, address: str, tickets: int, totals: dict, winners_count: int):
+    """Chance to be among the winners and whether it is an estimate.
+
+    Up to ``PRIZE_PROBABILITY_EXACT_LIMIT`` ticket holders it is computed exactly from their
+    ticket rows; above that it is estimated from the lottery aggregates.
+    """
+    if tickets <= 0 or totals["participants"] > settings.PRIZE_PROBABILITY_EXACT_LIMIT:
+        chance = prize_probability(tickets, totals["total_tickets"], totals["squared_tickets"],
+                                   totals["participants"], winners_count)
+        return chance, tickets > 0 and winners_count > 1
+
+    other_tickets = db.execute(other_holder_tickets_query(db, address)).scalars().all()
+    return exact_prize_probability(tickets, other_tickets, winners_count), False
+
+def other_holder_tickets_query(db: Session, address: str):
+    rows = ticket_rows_subquery(db)
+    return (
+        select(rows.c.total_tickets)
+        .where(rows.c.total_tickets > 0)
+        .where(rows.c.address != address)
+    )
+
+async def get_lottery_info_by_address_async(address: str, db: AsyncSession):
+    initial_delegator = await get_initial_delegator_async(address, db)
+    delegated = await get_delegation_amount_async(address)
+    return await db.run_sync(
+        lambda session: get_lottery_info_by_address(address, session, delegated, initial_delegator)
+    )
+
 def get_addresses_participating_in_lottery(db):
-    stacking_participants = get_participants_by_stakers(db)
-    invitation_participants = get_invitations_by_participants(db, stacking_participants)
-    return invitation_participants + stacking_participants
-
-def get_invitations_by_participants(db, stacking_participants):
-    result = []
-    invitations_dict = get_invitations_dict(db)
-    tickets_per_address = get_tickets_per_address(db)
-    for address, invitations in invitations_dict.items():
-        tickets = 0
-        for invitation in invitations:
-            tickets += tickets_per_address.get(invitation, 0)
-        if tickets > 0:
-            result.extend([address] * tickets)
-    all_invited = {address for addresesses in invitations_dict.values() for address in addresesses}
-    invitee_tickets = list(set(stacking_participants) & all_invited)
-    return result + invitee_tickets
-
-def get_participants_by_stakers(db):
-    delegator = models.Delegator
-    initial_delegator = models.InitialDelegator
-
-    results = (
-        db.query(
-            delegator.address,
-            ((delegator.amount - initial_delegator.amount) // 10).label("ticket_count")
-        )
-        .join(
-            initial_delegator,
-            delegator.address == initial_delegator.address
+    addresses = []
+    for row in iter_ticket_ledger(db):
+        addresses.extend([row["address"]] * row["total_tickets"])
+    return addresses
+
+def to_ledger_row(row):
+    return {
+        "address": row["address"],
+        "delegation_tickets": row["delegation_tickets"],
+        "referral_tickets": row["referral_tickets"],
+        "invitee_tickets": row["invitee_tickets"],
+        "total_tickets": row["total_tickets"],
+    }
+
+def ticket_ledger_query(db: Session, after: str = None, offset: int = 0, limit: int = None):
+    """Ticket holders ordered by address; ``after`` continues from a previous page's last address."""
+    tickets = ticket_rows_subquery(db)
+    query = (
+        select(
+            tickets.c.address,
+            tickets.c.delegation_tickets,
+            tickets.c.referral_tickets,
+            tickets.c.invitee_tickets,
+            tickets.c.total_tickets,
         )
-        .filter(initial_delegator.is_participate == True)
-        .all()
+        .where(tickets.c.total_tickets > 0)
+        .order_by(tickets.c.address)
+        .offset(offset)
+        .limit(limit)
+    )
+    if after is not None:
+        query = query.where(tickets.c.address > after)
+    return query
+
+def iter_ticket_ledger(db: Session, after: str = None, offset: int = 0, limit: int = None):
+    """Stream the ledger from a server-side cursor, ``LEDGER_BATCH_SIZE`` rows at a time."""
+    query = ticket_ledger_query(db, after, offset, limit).execution_options(
+        stream_results=True, yield_per=LEDGER_BATCH_SIZE
     )
+    for row in db.execute(query):
+        yield to_ledger_row(row._mapping)
+
+def get_ticket_ledger_page(db: Session, offset: int = 0, limit: int = 100, after: str = None):
+    items = [to_ledger_row(row._mapping) for row in db.execute(ticket_ledger_query(db, after, offset, limit))]
+    return {
+        "total": get_ticket_totals(db)["participants"],
+        "offset": offset,
+        "limit": limit,
+        "items": items,
+        "next_after": items[-1]["address"] if len(items) == limit else None,
+    }
 
-    addresses = []
-    for address, ticket_count in results:
-        if ticket_count > 0:
-            addresses.extend([address] * ticket_count)
+def lock_lottery(db: Session, lottery_id: int):
+    return (
+        db.query(models.Lottery)
+        .filter(models.Lottery.id == lottery_id)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
 
-    return addresses
 
-def draw_lottery(db):
-    addresses = get_addresses_participating_in_lottery(db)
+def commit_draw(db: Session, lottery: Lottery):
+    """Freeze the lottery's ledger and commit to the future block whose hash seeds the draw."""
+    lock_snapshot(db, lottery.id)
+    lottery = lock_lottery(db, lottery.id)
+    if lottery.draw_block_height is not None:
+        db.commit()
+        return
+
+    rebuild_ticket_snapshot(db, lottery)
+    ledger = get_lottery_ticket_rows(db, lottery, holders_only=True)
+
+    lottery.ledger_hash = ledger_hash((row["address"], row["total_tickets"]) for row in ledger)
+    lottery.draw_algorithm = DRAW_ALGORITHM
+    lottery.draw_block_height = get_latest_block_height() + settings.DRAW_SEED_BLOCK_OFFSET
+    db.commit()
+
+
+def draw_lottery(db, on_progress=None):
+    """Draw the active lottery.
+
+    After the commitment, the winners, the finished flag and the frozen result are written
+    in one transaction that holds a lock on the lottery row, so a failed or concurrent draw
+    never leaves a finished lottery without winners. A lottery without ticket holders is
+    finished without winners rather than retried forever.
+    """
+    def report(stage, **details):
+        if on_progress:
+            on_progress({"stage": stage, **details})
 
     lottery = db.query(models.Lottery).filter(models.Lottery.is_finished == False).first()
     if not lottery:
         raise ValueError("No active lottery.")
 
-    winners_count = min(lottery.winners_count,len(set(addresses)))
-
-    weighted_addresses = []
-    for address in addresses:
-        weighted_addresses.append(address)
-    random.shuffle(weighted_addresses)
-    main_winner = weighted_addresses[0]
-    winners = []
-    seen = set()
-    for address in weighted_addresses:
-        if address not in seen:
-            winners.append(address)
-            seen.add(address)
-        if len(winners) == winners_count:
-            break
+    if lottery.draw_block_height is None:
+        report("committing")
+        commit_draw(db, lottery)
+
+    report("waiting_for_seed", block_height=lottery.draw_block_height)
+    seed = wait_for_block_hash(lottery.draw_block_height)
+
+    report("drawing")
+    lottery = lock_lottery(db, lottery.id)
+    if lottery.is_finished:
+        db.rollback()
+        raise ValueError("Lottery is already drawn.")
+
+    lottery.draw_seed = seed
+    ledger = get_lottery_ticket_rows(db, lottery, holders_only=True)
+    winners = pick_winners(
+        ((row["address"], row["total_tickets"]) for row in ledger),
+        lottery.winners_count,
+        lottery.draw_seed
+    )
+    main_winner = winners[0] if winners else None
 
     lottery.is_finished = True
-    db.commit()
 
-    winners_objects = []
-    for i, address in enumerate(winners):
-        initial_delegator = db.query(models.InitialDelegator).filter(models.InitialDelegator.address == address).first()
-        is_main = (address == main_winner)
-        winner = models.Winner(
-            lottery_id=lottery.id,
-            initial_delegator_id=initial_delegator.id,
-            is_main=is_main
-        )
-        winners_objects.append(winner)
+    ledger_rows = {row["address"]: row for row in ledger}
+    delegator_ids = dict(
+        db.query(models.InitialDelegator.address, models.InitialDelegator.id)
+        .filter(models.InitialDelegator.address.in_(winners))
+        .all()
+    )
+    winner_rows = [
+        {
+            "lottery_id": lottery.id,
+            "initial_delegator_id": delegator_ids[address],
+            "is_main": address == main_winner,
+            "total_tickets": ledger_rows[address]["total_tickets"],
+            "amount_difference": ledger_rows[address]["amount"] - ledger_rows[address]["initial_amount"],
+        }
+        for address in winners
+    ]
+    if winner_rows:
+        db.execute(insert(models.Winner).values(winner_rows))
+    else:
+        logging.warning(f"Lottery {lottery.id} had no ticket holders, it is finished without winners")
 
-    db.add_all(winners_objects)
+    freeze_lottery_result(db, lottery)
     db.commit()
+    bump_data_version()
 
     result = {
         "lottery_id": lottery.id,
-        "is_finished": lottery.is_finished,
+        "is_finished": True,
         "winners": [
-            {"address": winner.initial_delegator.address, "is_main": winner.is_main}
-            for winner in winners_objects
+            {"address": address, "is_main": address == main_winner}
+            for address in winners
         ]
     }
 
     return result
 
 
-def get_lotteries_with_winners(db: Session):
-    try:
-        lotteries = db.query(models.Lottery).all()
-
-        lottery_with_winners = []
-        for lottery in lotteries:
-            winners = (
-                db.query(models.Winner, models.InitialDelegator.address)
-                .join(models.InitialDelegator, models.Winner.initial_delegator_id == models.InitialDelegator.id)
-                .filter(models.Winner.lottery_id == lottery.id)
-                .all()
-            )
-
-            winners_response = []
-            for winner, address in winners:
-                winner_data = {
-                    "address": address,
-                    "is_main": winner.is_main,
-                }
-                winners_response.append(winner_data)
-
-            lottery_data = {
-                "id": lottery.id,
-                "winners_count": lottery.winners_count,
-                "start_at": lottery.start_at,
-                "created_at": lottery.created_at,
-                "is_finished": lottery.is_finished,
-                "winners": winners_response,
-            }
-            lottery_with_winners.append(lottery_data)
-        return lottery_with_winners
-
-    except Exception as e:
-        raise Exception(f"Error: {str(e)}")
-
-
-def get_tickets_per_address(db: Session):
-    delegators_alias = aliased(models.Delegator)
-    initial_delegators_alias = aliased(models.InitialDelegator)
-
-    results = (
-        db.query(
-            delegators_alias.address,
-            ((delegators_alias.amount - initial_delegators_alias.amount) // 10).label("tickets")
-        )
-        .join(
-            initial_delegators_alias,
-            delegators_alias.address == initial_delegators_alias.address,
-            isouter=False
-        )
-        .filter(initial_delegators_alias.is_participate == True)
-        .filter(delegators_alias.amount - initial_delegators_alias.amount > 0)
-        .all()
-    )
-
-    tickets_dict = {row.address: row.tickets for row in results}
-    return tickets_dict
-
-
-def get_invitations_dict(db: Session):
-    inviter = aliased(models.InitialDelegator)
-    invitee = aliased(models.InitialDelegator)
-
+def get_lottery_history(db: Session, after_id: int = None, limit: int = 20):
     query = (
-        db.query(
-            inviter.address.label("inviter_address"),
-            invitee.address.label("invitee_address")
-        )
-        .join(Invitation, Invitation.inviter_id == inviter.id)
-        .join(invitee, Invitation.invitee_id == invitee.id)
+        db.query(models.Lottery)
+        .options(selectinload(models.Lottery.winners).joinedload(models.Winner.initial_delegator))
+        .order_by(models.Lottery.id)
     )
-
-    invitations_dict = {}
-    for row in query.all():
-        if row.inviter_address in invitations_dict:
-            invitations_dict[row.inviter_address].append(row.invitee_address)
-        else:
-            invitations_dict[row.inviter_address] = [row.invitee_address]
-
-    return invitations_dict
-
-
-def process_lottery(lottery: Lottery, db: Session) -> LotteryResponse:
-    winner_addresses = [winner.initial_delegator.address for winner in lottery.winners]
-
-    delegators = db.query(Delegator).filter(Delegator.address.in_(winner_addresses)).all()
-    initial_delegators = db.query(InitialDelegator).filter(InitialDelegator.address.in_(winner_addresses)).all()
-
-    delegator_dict = {d.address: d.amount for d in delegators}
-    initial_delegator_dict = {idg.address: idg.amount for idg in initial_delegators}
-
-    ticket_per_address = get_tickets_per_address(db)
-    invitations_dict = get_invitations_dict(db)
-
+    if after_id is not None:
+        query = query.filter(models.Lottery.id > after_id)
+    lotteries = query.limit(limit).all()
+
+    missing = {}
+    for lottery in lotteries:
+        for winner in lottery.winners:
+            if winner.total_tickets is None:
+                missing.setdefault(lottery.id, []).append(winner.initial_delegator.address)
+
+    ticket_rows = {}
+    if missing:
+        addresses = {address for addresses in missing.values() for address in addresses}
+        snapshots = (
+            db.query(models.TicketSnapshot)
+            .filter(models.TicketSnapshot.lottery_id.in_(missing))
+            .filter(models.TicketSnapshot.address.in_(addresses))
+            .all()
+        )
+        for snapshot in snapshots:
+            ticket_rows[(snapshot.lottery_id, snapshot.address)] = snapshot_to_dict(snapshot)
+
+        unresolved = {address for lottery_id, addresses in missing.items() for address in addresses
+                      if (lottery_id, address) not in ticket_rows}
+        if unresolved:
+            live_rows = {row["address"]: row for row in compute_ticket_rows(db, unresolved)}
+            for lottery_id, addresses in missing.items():
+                for address in addresses:
+                    if (lottery_id, address) not in ticket_rows and address in live_rows:
+                        ticket_rows[(lottery_id, address)] = live_rows[address]
+
+    return [
+        build_lottery_response(lottery, {
+            address: row for (lottery_id, address), row in ticket_rows.items() if lottery_id == lottery.id
+        })
+        for lottery in lotteries
+    ]
+
+
+def build_lottery_response(lottery: Lottery, ticket_rows) -> LotteryResponse:
+    """Serialise a lottery; winners without stored totals take them from ``ticket_rows``."""
     winners_response = []
     for winner in lottery.winners:
         address = winner.initial_delegator.address
-        initial_amount = initial_delegator_dict.get(address, 0)
-        current_amount = delegator_dict.get(address, 0)
-        amount_difference = current_amount - initial_amount
-
-        stacking_tickets = calculate_stacking_tickets(current_amount, initial_amount)
-        invitation_tickets = get_invitation_tickets(address, ticket_per_address, invitations_dict)
-        invitee_tickets = get_invitee_tickets(address, stacking_tickets, invitations_dict)
-        total_tickets_winner = stacking_tickets + invitation_tickets + invitee_tickets
+        if winner.total_tickets is not None:
+            amount_difference = winner.amount_difference
+            total_tickets_winner = winner.total_tickets
+        else:
+            row = ticket_rows.get(address, {})
+            amount_difference = row.get("amount", 0) - row.get("initial_amount", 0)
+            total_tickets_winner = row.get("total_tickets", 0)
 
         winners_response.append(WinnerResponse(
             id=winner.id,
@@ -405,4 +475,96 @@ def process_lottery(lottery: Lottery, db: Session) -> LotteryResponse:
         is_finished=lottery.is_finished,
         github_link=lottery.github_link,
         winners=winners_response
-    )
\ No newline at end of file
+    )
+
+
+def freeze_lottery_result(db: Session, lottery: Lottery):
+    """Serialise a finished lottery's response once and keep it on the row with its ETag.
+
+    The snapshot is final, and may be cached forever, once every prize has been claimed.
+    """
+    db.flush()
+    winners = (
+        db.query(models.Winner)
+        .options(joinedload(models.Winner.initial_delegator))
+        .filter(models.Winner.lottery_id == lottery.id)
+        .order_by(models.Winner.id)
+        .all()
+    )
+    set_committed_value(lottery, "winners", winners)
+    body = process_lottery(lottery, db).model_dump_json()
+    lottery.result_snapshot = body
+    lottery.result_etag = '"' + hashlib.sha256(body.encode()).hexdigest() + '"'
+    lottery.result_is_final = all(winner.is_claim_prize for winner in lottery.winners)
+
+
+def get_frozen_lottery_result(db: Session, lottery: Lottery):
+    """Frozen response of a finished lottery, freezing it on first read if the draw predates snapshots."""
+    if not lottery.result_snapshot:
+        freeze_lottery_result(db, lottery)
+        db.commit()
+    return lottery.result_snapshot, lottery.result_etag, lottery.result_is_final
+
+
+def process_lottery(lottery: Lottery, db: Session) -> LotteryResponse:
+    missing = [winner.initial_delegator.address for winner in lottery.winners if winner.total_tickets is None]
+
+    ticket_rows = {}
+    if missing:
+        ticket_rows = {row["address"]: row for row in get_lottery_ticket_rows(db, lottery, missing)}
+
+    return build_lottery_response(lottery, ticket_rows)
+
+
+def get_draw_commitment(db: Session, lottery: Lottery, include_ledger: bool = False):
+    """The ledger hash and seed block a draw committed to, published before the seed block exists."""
+    if lottery.draw_block_height is None:
+        raise HTTPException(status_code=400, detail="Lottery draw is not committed yet")
+
+    result = {
+        "lottery_id": lottery.id,
+        "algorithm": lottery.draw_algorithm,
+        "ledger_hash": lottery.ledger_hash,
+        "block_height": lottery.draw_block_height,
+        "winners_count": lottery.winners_count,
+        "is_drawn": lottery.is_finished,
+    }
+    if include_ledger:
+        result["ledger"] = [
+            (row["address"], row["total_tickets"])
+            for row in get_lottery_ticket_rows(db, lottery, holders_only=True)
+        ]
+    return result
+
+
+def verify_lottery_draw(db: Session, lottery: Lottery, include_ledger: bool = False):
+    """Replay a seeded draw from the lottery's ticket snapshot and compare it with the stored winners."""
+    if not lottery.is_finished or not lottery.draw_seed:
+        raise HTTPException(status_code=400, detail="Lottery was not drawn with a committed seed")
+
+    ledger = [
+        (row["address"], row["total_tickets"])
+        for row in get_lottery_ticket_rows(db, lottery, holders_only=True)
+    ]
+    replayed = pick_winners(ledger, lottery.winners_count, lottery.draw_seed)
+    stored = [
+        winner.initial_delegator.address
+        for winner in sorted(lottery.winners, key=lambda winner: (not winner.is_main, winner.id))
+    ]
+    computed_hash = ledger_hash(ledger)
+
+    result = {
+        "lottery_id": lottery.id,
+        "algorithm": lottery.draw_algorithm,
+        "block_height": lottery.draw_block_height,
+        "seed": lottery.draw_seed,
+        "winners_count": lottery.winners_count,
+        "ledger_hash": lottery.ledger_hash,
+        "ledger_hash_matches": computed_hash == lottery.ledger_hash,
+        "winners": stored,
+        "replayed_winners": replayed,
+        "is_valid": computed_hash == lottery.ledger_hash and replayed == stored,
+    }
+    if include_ledger:
+        result["ledger"] = ledger
+    return result
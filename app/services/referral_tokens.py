@@ -0,0 +1,49 @@
+import hashlib
+import hmac
+import string
+
+from app.core.config import settings
+
+ALPHABET = string.ascii_letters + string.digits
+TOKEN_LENGTH = 6
+TOKEN_SPACE = len(ALPHABET) ** TOKEN_LENGTH
+
+HALF_BITS = 18
+HALF_MASK = (1 << HALF_BITS) - 1
+ROUNDS = 6
+
+KEY = hashlib.sha256(f"referral-token:{settings.SECRET_KEY}".encode()).digest()
+
+
+def round_function(tweak: int, round_index: int, half: int) -> int:
+    digest = hmac.new(KEY, f"{tweak}:{round_index}:{half}".encode(), hashlib.sha256).digest()
+    return int.from_bytes(digest[:4], "big") & HALF_MASK
+
+
+def permute(value: int, tweak: int) -> int:
+    """Keyed Feistel permutation of the 36-bit integers."""
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_index in range(ROUNDS):
+        left, right = right, left ^ round_function(tweak, round_index, right)
+    return (left << HALF_BITS) | right
+
+
+def encode(value: int) -> str:
+    chars = []
+    for _ in range(TOKEN_LENGTH):
+        value, remainder = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+def referral_token_for(delegator_id: int, tweak: int = 0) -> str:
+    """Six character token that is unique per id, without looking at the table.
+
+    The 36-bit Feistel permutation is cycle-walked until it lands inside the 62^6 token
+    space, which makes it a bijection on that space. Different ``tweak`` values give
+    independent permutations, used when a legacy random token is already taken.
+    """
+    value = permute(delegator_id, tweak)
+    while value >= TOKEN_SPACE:
+        value = permute(value, tweak)
+    return encode(value)
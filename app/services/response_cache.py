@@ -0,0 +1,85 @@
+import hashlib
+import json
+import time
+
+import redis
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from starlette import status
+
+from app.core.config import settings
+from app.core.redis import redis_client
+
+DATA_VERSION_KEY = "data_version"
+
+
+def bump_data_version():
+    """Invalidate every cached response derived from delegations, participants or invitations."""
+    try:
+        redis_client.incr(DATA_VERSION_KEY)
+    except redis.RedisError:
+        pass
+
+
+def get_data_version():
+    try:
+        return int(redis_client.get(DATA_VERSION_KEY) or 0)
+    except redis.RedisError:
+        return None
+
+
+def render(builder):
+    return json.dumps(jsonable_encoder(builder()), separators=(",", ":")).encode()
+
+
+def get_or_render(key: str, builder):
+    """Pre-rendered JSON for ``key``; only one caller renders it while the others wait.
+
+    Waiters give up as soon as the lock is gone without a body, i.e. the renderer failed,
+    and render themselves so that its error (a 404, say) reaches them right away.
+    """
+    body = redis_client.get(key)
+    if body is not None:
+        return body
+
+    lock_key = f"{key}:lock"
+    if redis_client.set(lock_key, 1, nx=True, ex=settings.RESPONSE_CACHE_LOCK_TIMEOUT):
+        try:
+            body = render(builder)
+            redis_client.set(key, body, ex=settings.RESPONSE_CACHE_TTL)
+            return body
+        finally:
+            redis_client.delete(lock_key)
+
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        body = redis_client.get(key)
+        if body is not None:
+            return body
+        if not redis_client.exists(lock_key):
+            break
+    return render(builder)
+
+
+def cached_json_response(request: Request, name: str, params: dict, builder) -> Response:
+    """Serve ``builder()`` as JSON cached under the current data version.
+
+    The ETag is derived from the version and parameters, so a matching ``If-None-Match``
+    is answered with 304 without reading the body or touching the database.
+    """
+    version = get_data_version()
+    if version is None:
+        return Response(content=render(builder), media_type="application/json")
+
+    params_key = hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:16]
+    etag = f'"{name}-{version}-{params_key}"'
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    try:
+        body = get_or_render(f"response:{name}:{version}:{params_key}", builder)
+    except redis.RedisError:
+        body = render(builder)
+    return Response(content=body, media_type="application/json", headers=headers)
@@ -0,0 +1,55 @@
+import base64
+import json
+from functools import lru_cache
+from hashlib import sha256
+
+from cosmpy.crypto.address import Address
+from cosmpy.crypto.keypairs import PublicKey
+
+from app.core.config import settings
+
+SIGNED_MESSAGE = "i am in brottery"
+ADDRESS_PREFIX = "cosmos"
+
+
+def adr036_sign_doc(signer: str, message: str) -> bytes:
+    """Amino JSON sign doc a wallet signs for ``signArbitrary`` (ADR-036)."""
+    doc = {
+        "account_number": "0",
+        "chain_id": "",
+        "fee": {"amount": [], "gas": "0"},
+        "memo": "",
+        "msgs": [{
+            "type": "sign/MsgSignData",
+            "value": {"data": base64.b64encode(message.encode()).decode(), "signer": signer},
+        }],
+        "sequence": "0",
+    }
+    return json.dumps(doc, sort_keys=True, separators=(",", ":")).encode()
+
+
+def pubkey_to_address(public_key: PublicKey) -> str:
+    return str(Address(public_key, prefix=ADDRESS_PREFIX))
+
+
+@lru_cache(maxsize=settings.SIGNATURE_CACHE_SIZE)
+def validate_signature(pubkey: str, signatures: str, address: str) -> bool:
+    """Whether ``signatures`` is ``address``'s signature of :data:`SIGNED_MESSAGE`.
+
+    The base64 ``pubkey`` must derive ``address``. The signature is checked against the
+    ADR-036 sign doc and, for older clients, against the bare message. Verdicts are cached
+    per ``(pubkey, signature, address)``.
+    """
+    try:
+        public_key = PublicKey(base64.b64decode(pubkey, validate=True))
+        signature = base64.b64decode(signatures, validate=True)
+    except (ValueError, AssertionError):
+        return False
+
+    if pubkey_to_address(public_key) != address:
+        return False
+
+    for signed in (adr036_sign_doc(address, SIGNED_MESSAGE), SIGNED_MESSAGE.encode()):
+        if public_key.verify_digest(sha256(signed).digest(), signature):
+            return True
+    return False
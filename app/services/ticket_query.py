@@ -0,0 +1,124 @@
+from sqlalchemy import BigInteger, Integer, and_, case, func, literal, select
+from sqlalchemy.orm import aliased
+
+from app.db.models import Delegator, InitialDelegator, Invitation
+
+
+def stacking_tickets_expr(amount, initial_amount):
+    return func.greatest(func.coalesce(amount, 0) - initial_amount, 0, type_=Integer) // 10
+
+
+def ticket_components_query(addresses=None, inviters_only: bool = False, holders_only: bool = False):
+    """One row per participating address with every ticket component, computed in SQL.
+
+    ``addresses`` restricts the rows (and the invitations read) to those addresses,
+    ``inviters_only`` keeps addresses that invited someone and ``holders_only`` keeps
+    addresses with at least one ticket.
+    """
+    participant_filter = InitialDelegator.is_participate == True
+    if addresses is not None:
+        participant_filter = and_(participant_filter, InitialDelegator.address.in_(addresses))
+
+    participants = (
+        select(
+            InitialDelegator.id,
+            InitialDelegator.address,
+            InitialDelegator.amount.label("initial_amount"),
+            func.coalesce(Delegator.amount, 0).label("amount"),
+            stacking_tickets_expr(Delegator.amount, InitialDelegator.amount).label("delegation_tickets"),
+        )
+        .outerjoin(Delegator, Delegator.address == InitialDelegator.address)
+        .where(participant_filter)
+        .cte("participants")
+    )
+
+    invitee = aliased(InitialDelegator)
+    invitee_delegator = aliased(Delegator)
+    referrals = (
+        select(
+            Invitation.inviter_id,
+            func.count(Invitation.id).label("invited_count"),
+            func.coalesce(func.sum(case(
+                (invitee.is_participate == True,
+                 stacking_tickets_expr(invitee_delegator.amount, invitee.amount)),
+                else_=0
+            )), 0).label("referral_tickets"),
+        )
+        .join(invitee, invitee.id == Invitation.invitee_id)
+        .outerjoin(invitee_delegator, invitee_delegator.address == invitee.address)
+        .where(Invitation.inviter_id.in_(select(participants.c.id)))
+        .group_by(Invitation.inviter_id)
+        .cte("referrals")
+    )
+
+    invited = (
+        select(Invitation.invitee_id)
+        .where(Invitation.invitee_id.in_(select(participants.c.id)))
+        .distinct()
+        .cte("invited")
+    )
+
+    is_invitee = invited.c.invitee_id.isnot(None)
+    referral_tickets = func.coalesce(referrals.c.referral_tickets, 0)
+    invitee_tickets = case((and_(is_invitee, participants.c.delegation_tickets > 0), 1), else_=0)
+    total_tickets = participants.c.delegation_tickets + referral_tickets + invitee_tickets
+
+    query = (
+        select(
+            participants.c.address,
+            participants.c.initial_amount,
+            participants.c.amount,
+            participants.c.delegation_tickets.label("delegation_tickets"),
+            referral_tickets.cast(Integer).label("referral_tickets"),
+            invitee_tickets.label("invitee_tickets"),
+            total_tickets.cast(Integer).label("total_tickets"),
+            func.coalesce(referrals.c.invited_count, 0).label("invited_count"),
+            is_invitee.label("is_invitee"),
+        )
+        .outerjoin(referrals, referrals.c.inviter_id == participants.c.id)
+        .outerjoin(invited, invited.c.invitee_id == participants.c.id)
+        .order_by(participants.c.address)
+    )
+    if inviters_only:
+        query = query.where(referrals.c.inviter_id.isnot(None))
+    if holders_only:
+        query = query.where(total_tickets > 0)
+    return query
+
+
+def ticket_totals_query():
+    """Grand totals over :func:`ticket_components_query`."""
+    components = ticket_components_query().order_by(None).subquery()
+    return select(
+        func.coalesce(func.sum(components.c.total_tickets), 0).label("total_tickets"),
+        func.count().filter(components.c.total_tickets > 0).label("participants"),
+        func.coalesce(func.sum(components.c.total_tickets.cast(BigInteger) * components.c.total_tickets), 0)
+        .label("squared_tickets"),
+        func.coalesce(func.sum(components.c.delegation_tickets), 0).label("delegation_tickets"),
+        func.coalesce(func.sum(components.c.referral_tickets), 0).label("referral_tickets"),
+        func.coalesce(func.sum(components.c.invitee_tickets), 0).label("invitee_tickets"),
+    )
+
+
+def snapshot_select(lottery_id: int, addresses=None):
+    """:func:`ticket_components_query` shaped for ``INSERT INTO ticket_snapshots ... SELECT``."""
+    components = ticket_components_query(addresses).order_by(None).subquery()
+    return select(literal(lottery_id).label("lottery_id"), *components.c)
+
+
+def ranking_query(source, tickets, *columns, where=None):
+    """Rows of ``source`` ranked by ``tickets``, highest first.
+
+    Tied rows share ``position`` (``RANK()``); ``ordinal`` breaks ties by address and is
+    the stable key pages and neighbour lookups are cut on.
+    """
+    query = select(
+        source.c.address,
+        tickets.label("tickets"),
+        *columns,
+        func.rank().over(order_by=tickets.desc()).label("position"),
+        func.row_number().over(order_by=(tickets.desc(), source.c.address)).label("ordinal"),
+    )
+    if where is not None:
+        query = query.where(where)
+    return query.cte("ranked")
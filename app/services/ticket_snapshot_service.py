@@ -0,0 +1,225 @@
+import hashlib
+
+from sqlalchemy import BigInteger, delete, func, insert, select, update
+from sqlalchemy.orm import Session, aliased
+
+from app.db.models import InitialDelegator, Invitation, Lottery, TicketSnapshot
+from app.services.ticket_query import snapshot_select, ticket_components_query, ticket_totals_query
+
+SNAPSHOT_COLUMNS = (
+    "address",
+    "initial_amount",
+    "amount",
+    "delegation_tickets",
+    "referral_tickets",
+    "invitee_tickets",
+    "total_tickets",
+    "invited_count",
+    "is_invitee",
+)
+
+# Namespaces of the two-key advisory locks guarding the snapshots.
+SNAPSHOT_LOCK = 1
+ADDRESS_LOCK = 2
+
+
+def compute_ticket_rows(db: Session, addresses=None, inviters_only: bool = False, holders_only: bool = False):
+    """Compute every ticket component per participating address from the live tables."""
+    query = ticket_components_query(addresses, inviters_only=inviters_only, holders_only=holders_only)
+    return [dict(row._mapping) for row in db.execute(query)]
+
+
+def insert_snapshot_rows(db: Session, lottery_id: int, addresses=None):
+    columns = ("lottery_id",) + SNAPSHOT_COLUMNS
+    result = db.execute(
+        insert(TicketSnapshot).from_select(columns, snapshot_select(lottery_id, addresses))
+    )
+    return result.rowcount
+
+
+def rebuild_ticket_snapshot(db: Session, lottery: Lottery):
+    """Replace the lottery's snapshot with freshly computed rows. The caller commits."""
+    lock_snapshot(db, lottery.id)
+    db.execute(delete(TicketSnapshot).where(TicketSnapshot.lottery_id == lottery.id))
+    count = insert_snapshot_rows(db, lottery.id)
+    lottery.total_tickets, lottery.participants_count, lottery.squared_tickets = get_snapshot_totals(db, lottery.id)
+    lottery.ticket_snapshot_at = func.now()
+    db.flush()
+
+    return count
+
+
+def refresh_ticket_snapshot(db: Session, address: str):
+    """Recompute the snapshot rows affected by a change to ``address``: its own row and its inviter's.
+
+    Refreshes share the lottery's snapshot lock and lock only the affected addresses until
+    the caller commits, so refreshes of different addresses run side by side while a
+    rebuild, which takes the snapshot lock exclusively, waits for them and holds them off.
+    Only the closing update of the lottery totals queues on the lottery row; the caller
+    should commit right after it.
+    """
+    lottery = get_snapshot_lottery(db)
+    if not lottery:
+        return
+    db.execute(select(func.pg_advisory_xact_lock_shared(SNAPSHOT_LOCK, lottery.id)))
+    # A draw may have frozen the snapshot while we waited for the lock.
+    lottery = get_snapshot_lottery(db, refresh=True)
+    if not lottery:
+        return
+
+    inviter = aliased(InitialDelegator)
+    invitee = aliased(InitialDelegator)
+    inviters = (
+        db.query(inviter.address)
+        .join(Invitation, Invitation.inviter_id == inviter.id)
+        .join(invitee, Invitation.invitee_id == invitee.id)
+        .filter(invitee.address == address)
+        .all()
+    )
+    affected = [address] + [row.address for row in inviters]
+    lock_addresses(db, affected)
+
+    old_tickets, old_participants, old_squared = get_snapshot_totals(db, lottery.id, affected)
+    db.execute(
+        delete(TicketSnapshot)
+        .where(TicketSnapshot.lottery_id == lottery.id)
+        .where(TicketSnapshot.address.in_(affected))
+    )
+    insert_snapshot_rows(db, lottery.id, affected)
+    new_tickets, new_participants, new_squared = get_snapshot_totals(db, lottery.id, affected)
+
+    db.execute(
+        update(Lottery)
+        .where(Lottery.id == lottery.id)
+        .values(
+            total_tickets=Lottery.total_tickets + (new_tickets - old_tickets),
+            participants_count=Lottery.participants_count + (new_participants - old_participants),
+            squared_tickets=Lottery.squared_tickets + (new_squared - old_squared)
+        )
+        .execution_options(synchronize_session="fetch")
+    )
+    db.flush()
+
+
+def get_snapshot_totals(db: Session, lottery_id: int, addresses=None):
+    """Total tickets, ticket holders and sum of squared tickets in a lottery's snapshot."""
+    squared = TicketSnapshot.total_tickets.cast(BigInteger) * TicketSnapshot.total_tickets
+    query = (
+        db.query(
+            func.coalesce(func.sum(TicketSnapshot.total_tickets), 0),
+            func.count().filter(TicketSnapshot.total_tickets > 0),
+            func.coalesce(func.sum(squared), 0)
+        )
+        .filter(TicketSnapshot.lottery_id == lottery_id)
+    )
+    if addresses is not None:
+        query = query.filter(TicketSnapshot.address.in_(addresses))
+    total_tickets, participants, squared_tickets = query.one()
+    return int(total_tickets), participants, int(squared_tickets)
+
+
+def get_snapshot_lottery(db: Session, refresh: bool = False):
+    query = (
+        db.query(Lottery)
+        .filter(Lottery.is_finished == False)
+        .filter(Lottery.ticket_snapshot_at.isnot(None))
+        .filter(Lottery.draw_block_height.is_(None))
+    )
+    if refresh:
+        query = query.populate_existing()
+    return query.first()
+
+
+def lock_snapshot(db: Session, lottery_id: int):
+    """Take the lottery's snapshot lock exclusively until commit, waiting for running refreshes.
+
+    Take it before locking the lottery row: refreshes update that row under the shared lock.
+    """
+    db.execute(select(func.pg_advisory_xact_lock(SNAPSHOT_LOCK, lottery_id)))
+
+
+def address_lock_key(address: str) -> int:
+    return int.from_bytes(hashlib.blake2b(address.encode(), digest_size=4).digest(), "big", signed=True)
+
+
+def lock_addresses(db: Session, addresses):
+    """Lock the snapshot rows of ``addresses`` until commit, in key order so lockers cannot deadlock."""
+    for key in sorted({address_lock_key(address) for address in addresses}):
+        db.execute(select(func.pg_advisory_xact_lock(ADDRESS_LOCK, key)))
+
+
+def snapshot_to_dict(snapshot: TicketSnapshot):
+    return {column: getattr(snapshot, column) for column in SNAPSHOT_COLUMNS}
+
+
+def get_lottery_ticket_rows(db: Session, lottery: Lottery, addresses=None,
+                            inviters_only: bool = False, holders_only: bool = False):
+    """Ticket rows of a lottery, read from its snapshot when there is one."""
+    if not lottery or not lottery.ticket_snapshot_at:
+        return compute_ticket_rows(db, addresses, inviters_only=inviters_only, holders_only=holders_only)
+
+    query = db.query(TicketSnapshot).filter(TicketSnapshot.lottery_id == lottery.id)
+    if addresses is not None:
+        query = query.filter(TicketSnapshot.address.in_(addresses))
+    if inviters_only:
+        query = query.filter(TicketSnapshot.invited_count > 0)
+    if holders_only:
+        query = query.filter(TicketSnapshot.total_tickets > 0)
+    return [snapshot_to_dict(row) for row in query.order_by(TicketSnapshot.address).all()]
+
+
+def get_ticket_rows(db: Session, addresses=None, inviters_only: bool = False, holders_only: bool = False):
+    """Ticket rows of the active lottery, computed live when it has no snapshot yet."""
+    return get_lottery_ticket_rows(db, get_snapshot_lottery(db), addresses,
+                                   inviters_only=inviters_only, holders_only=holders_only)
+
+
+def ticket_rows_subquery(db: Session):
+    """The active lottery's ticket rows as a subquery: its snapshot, or the live computation."""
+    lottery = get_snapshot_lottery(db)
+    if not lottery:
+        return ticket_components_query().subquery("tickets")
+
+    columns = [getattr(TicketSnapshot, column) for column in SNAPSHOT_COLUMNS]
+    return select(*columns).where(TicketSnapshot.lottery_id == lottery.id).subquery("tickets")
+
+
+def ranked_page_query(ranked, offset: int = 0, limit: int = None):
+    # Same order as ``ordinal``, spelled out so the planner can use the index order under the window.
+    return select(ranked).order_by(ranked.c.tickets.desc(), ranked.c.address).offset(offset).limit(limit)
+
+
+def get_ranked_rows(db: Session, ranked, offset: int = 0, limit: int = None):
+    return db.execute(ranked_page_query(ranked, offset, limit)).all()
+
+
+def ranked_neighbours_query(ranked, address: str, neighbours: int):
+    ordinal = select(ranked.c.ordinal).where(ranked.c.address == address).scalar_subquery()
+    return (
+        select(ranked)
+        .where(ranked.c.ordinal.between(ordinal - neighbours, ordinal + neighbours))
+        .order_by(ranked.c.ordinal)
+    )
+
+
+def get_ranked_neighbours(db: Session, ranked, address: str, neighbours: int):
+    """The ranked row of ``address`` with up to ``neighbours`` rows on each side; empty if unranked."""
+    return db.execute(ranked_neighbours_query(ranked, address, neighbours)).all()
+
+
+def get_ticket_totals(db: Session):
+    """Ticket aggregates of the active lottery, kept up to date with its snapshot."""
+    lottery = get_snapshot_lottery(db)
+    if not lottery or lottery.total_tickets is None:
+        totals = db.execute(ticket_totals_query()).one()
+        return {
+            "total_tickets": totals.total_tickets,
+            "participants": totals.participants,
+            "squared_tickets": totals.squared_tickets,
+        }
+
+    return {
+        "total_tickets": lottery.total_tickets,
+        "participants": lottery.participants_count,
+        "squared_tickets": lottery.squared_tickets,
+    }
@@ -1,32 +1,162 @@
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+
 from celery import shared_task
 from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.core.redis import redis_client
 from app.db import models
 from app.db.database import SessionLocal
 
-from app.services.general import get_delegators_from_cosmos
+from app.services.delegator_service import bulk_sync_delegators
+from app.services.general import get_latest_block_height, iter_delegator_pages
+from app.services.initial_delegator_service import claim_import, extend_import, fetch_delegators_data, \
+    release_import
+from app.services.lottery_service import draw_lottery
+from app.services.response_cache import bump_data_version
+from app.services.ticket_snapshot_service import rebuild_ticket_snapshot
+
+def sync_delegations(db: Session):
+    """Sync delegations from the latest block and rebuild the snapshot of an undrawn lottery."""
+    height = get_latest_block_height()
+    counts = bulk_sync_delegators(db, iter_delegator_pages(height=height))
+
+    lottery = (
+        db.query(models.Lottery)
+        .filter(models.Lottery.is_finished == False)
+        .filter(models.Lottery.draw_block_height.is_(None))
+        .first()
+    )
+    if lottery:
+        rebuild_ticket_snapshot(db, lottery)
+
+    db.commit()
+    bump_data_version()
+    return height, counts
+
 
 @shared_task
 def sync_delegators():
     db: Session = SessionLocal()
 
     try:
-        delegators = get_delegators_from_cosmos()
-        db.query(models.Delegator).delete()
-        for delegation in delegators:
-            delegator_address = delegation.delegation.delegator_address
-            amount = int(delegation.balance.amount) / 1_000_000
-
-            new_entry = models.Delegator(
-                address=delegator_address,
-                amount=amount
-            )
-            db.add(new_entry)
-
-        db.commit()
+        height, counts = sync_delegations(db)
     except Exception as e:
         db.rollback()
         print(f"Error while getting validators: {e}")
+        return f"Delegators sync failed: {e}"
+    finally:
+        db.close()
+
+    logging.info(f"Delegators sync: {counts}")
+    return (f"Synced {counts['fetched']} delegations at height {height}: inserted {counts['inserted']}, "
+            f"updated {counts['updated']}, deleted {counts['deleted']} delegators.")
+
+
+@shared_task(bind=True)
+def populate_initial_delegators(self):
+    running = claim_import(self.request.id)
+    if running:
+        logging.info(f"Initial delegators import is already running as task {running}")
+        return {"running_task_id": running}
+
+    db: Session = SessionLocal()
+
+    def report(progress):
+        extend_import(self.request.id)
+        self.update_state(state="PROGRESS", meta={"pages": progress["pages"], "imported": progress["imported"]})
+
+    try:
+        result = fetch_delegators_data(db, on_progress=report)
+    except Exception:
+        db.rollback()
+        logging.exception("Initial delegators import failed, it will resume from the last checkpoint")
+        raise
+    finally:
+        db.close()
+        release_import(self.request.id)
+
+    logging.info(f"Initial delegators import: {result}")
+    return result
+
+
+@shared_task(bind=True)
+def run_lottery_draw(self):
+    """Draw the active lottery on delegations synced right before its ledger is committed.
+
+    A failed sync fails the draw, so a lottery is never drawn on stale delegations.
+    """
+    db: Session = SessionLocal()
+
+    def report(progress):
+        self.update_state(state="PROGRESS", meta=progress)
+
+    try:
+        lottery = db.query(models.Lottery).filter(models.Lottery.is_finished == False).first()
+        if lottery and lottery.draw_block_height is None:
+            report({"stage": "syncing"})
+            height, counts = sync_delegations(db)
+            logging.info(f"Pre-draw delegators sync at height {height}: {counts}")
+        result = draw_lottery(db, on_progress=report)
+    except Exception:
+        db.rollback()
+        logging.exception("Lottery draw failed")
+        raise
+    finally:
+        db.close()
+
+    logging.info(f"Lottery draw: {result}")
+    return result
+
+
+def claim_lottery_draw(lottery_id: int, task_id: str):
+    """Claim the draw of a lottery for ``task_id``; returns the id of the task holding it, or None.
+
+    The claim expires after ``LOTTERY_DRAW_RETRY``, so a draw that failed is tried again then.
+    """
+    key = f"lottery:{lottery_id}:draw"
+    while not redis_client.set(key, task_id, nx=True, ex=settings.LOTTERY_DRAW_RETRY):
+        running = redis_client.get(key)
+        if running is not None:
+            running = running.decode()
+            return None if running == task_id else running
+    return None
+
+
+def release_lottery_draw(lottery_id: int, task_id: str):
+    key = f"lottery:{lottery_id}:draw"
+    if redis_client.get(key) == task_id.encode():
+        redis_client.delete(key)
+
+
+@shared_task
+def dispatch_lottery_schedule():
+    """Run the early sync and then the draw of the active lottery once they are due.
+
+    Triggered by beat and by the ETA tasks queued when a lottery is created. Each step is
+    claimed in Redis per lottery, so repeated triggers start it only once. The early sync
+    only warms the snapshot up; the draw task syncs again itself before committing.
+    """
+    db: Session = SessionLocal()
+
+    try:
+        lottery = db.query(models.Lottery).filter(models.Lottery.is_finished == False).first()
+        if not lottery:
+            return "No active lottery."
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        sync_at = lottery.start_at - timedelta(seconds=settings.LOTTERY_SYNC_LEAD)
+        if now >= lottery.start_at:
+            task_id = str(uuid.uuid4())
+            if not claim_lottery_draw(lottery.id, task_id):
+                run_lottery_draw.apply_async(task_id=task_id)
+                return f"Draw of lottery {lottery.id} started."
+        elif now >= sync_at and lottery.draw_block_height is None:
+            if redis_client.set(f"lottery:{lottery.id}:sync", 1, nx=True, ex=settings.LOTTERY_SYNC_LEAD):
+                sync_delegators.delay()
+                return f"Pre-draw sync of lottery {lottery.id} started."
     finally:
         db.close()
 
-    return f"Added {len(delegators)} delegators to  Delegator."
+    return "Nothing due."
@@ -0,0 +1,70 @@
+"""Replay a lottery draw offline against its published commitment.
+
+    python -m app.verify_draw https://<api>/lotteries/<id>/verify?include_ledger=true \
+        --ledger-hash <hash> --block-height <height> --node https://<lcd>
+
+``--ledger-hash`` and ``--block-height`` are the values ``/lotteries/{id}/commitment``
+published before the seed block was produced; record them then, the server's later answers
+are not evidence. The seed is fetched from ``--node`` (any Cosmos REST endpoint) rather
+than taken from the server, and the winners are recomputed locally from that seed and
+the ledger.
+"""
+import argparse
+import base64
+import json
+import sys
+import urllib.request
+
+from app.services.draw_service import DRAW_ALGORITHM, ledger_hash, pick_winners
+
+
+def load(source: str):
+    if source.startswith(("http://", "https://")):
+        with urllib.request.urlopen(source) as response:
+            return json.load(response)
+    with open(source) as f:
+        return json.load(f)
+
+
+def fetch_block_hash(node: str, height: int) -> str:
+    """Hex hash of block ``height`` as reported by a node's REST API."""
+    block = load(f"{node.rstrip('/')}/cosmos/base/tendermint/v1beta1/blocks/{height}")
+    return base64.b64decode(block["block_id"]["hash"]).hex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify a lottery draw against its published commitment.")
+    parser.add_argument("source", help="URL or file with the /lotteries/{id}/verify?include_ledger=true response")
+    parser.add_argument("--ledger-hash", required=True, help="Ledger hash published before the draw")
+    parser.add_argument("--block-height", required=True, type=int, help="Seed block height published before the draw")
+    parser.add_argument("--node", required=True, help="REST endpoint of a chain node to read the seed block from")
+    args = parser.parse_args()
+
+    draw = load(args.source)
+    if draw["algorithm"] != DRAW_ALGORITHM:
+        print(f"Unsupported draw algorithm {draw['algorithm']!r}, expected {DRAW_ALGORITHM!r}")
+        return 2
+
+    seed = fetch_block_hash(args.node, args.block_height)
+    ledger = [(address, tickets) for address, tickets in draw["ledger"]]
+    computed_hash = ledger_hash(ledger)
+    winners = pick_winners(ledger, draw["winners_count"], seed)
+
+    checks = {
+        "block height": draw["block_height"] == args.block_height,
+        "seed": draw["seed"] == seed,
+        "ledger hash": computed_hash == args.ledger_hash,
+        "winners": winners == draw["winners"],
+    }
+
+    print(f"Lottery {draw['lottery_id']}: seed {seed} (block {args.block_height} from {args.node})")
+    print(f"Ledger hash: {computed_hash} (published {args.ledger_hash})")
+    print(f"Winners: {', '.join(winners)}")
+    for name, ok in checks.items():
+        print(f"  {name}: {'ok' if ok else 'MISMATCH'}")
+
+    return 0 if all(checks.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""Micro-benchmark of participant signature verification.
+
+    python -m tests.benchmark_signature [--seconds 3] [--threads 4]
+
+Reports verifies per second for the uncached check, cache hits, and the uncached check
+spread over a thread pool as the sync routes run it.
+"""
+import argparse
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+
+import tests.conftest  # noqa: F401 - default settings for running outside the app
+
+from cosmpy.crypto.keypairs import PrivateKey
+
+from app.services.signature import SIGNED_MESSAGE, adr036_sign_doc, pubkey_to_address, validate_signature
+
+
+def make_signature():
+    private_key = PrivateKey()
+    address = pubkey_to_address(private_key.public_key)
+    signature = private_key.sign_digest(sha256(adr036_sign_doc(address, SIGNED_MESSAGE)).digest())
+    pubkey = base64.b64encode(private_key.public_key.public_key_bytes).decode()
+    return pubkey, base64.b64encode(signature).decode(), address
+
+
+def rate(fn, seconds: float) -> float:
+    calls = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+def threaded_rate(fn, seconds: float, threads: int) -> float:
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        return sum(executor.map(lambda _: rate(fn, seconds), range(threads)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    pubkey, signature, address = make_signature()
+    assert validate_signature(pubkey, signature, address)
+    uncached = validate_signature.__wrapped__
+
+    print(f"uncached:            {rate(lambda: uncached(pubkey, signature, address), args.seconds):10.0f} verifies/s")
+    print(f"cached:              {rate(lambda: validate_signature(pubkey, signature, address), args.seconds):10.0f} verifies/s")
+    threaded = threaded_rate(lambda: uncached(pubkey, signature, address), args.seconds, args.threads)
+    print(f"uncached, {args.threads} threads: {threaded:10.0f} verifies/s")
+
+
+if __name__ == "__main__":
+    main()
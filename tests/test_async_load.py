@@ -0,0 +1,144 @@
+"""Load test of the async info endpoint against PostgreSQL.
+
+The real service code runs on an ``AsyncSession`` over ``TEST_DATABASE_URL``; only the
+chain lookup and Redis are replaced. Skipped without ``TEST_DATABASE_URL``.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+
+from app.db.database import Base, get_async_db
+from app.db.models import Delegator, InitialDelegator, Invitation, Lottery
+from app.main import app
+from app.services import general, response_cache
+from app.services.cache import TTLCache
+from app.services.ticket_snapshot_service import rebuild_ticket_snapshot
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+PARTICIPANTS = 60
+REQUESTS = 20
+LATENCY = 0.2
+# Running the ORM on the loop stalls it for about 0.6 s here; run_sync leaves only the CPU
+# work of the ORM and the exact prize probability, well under 0.15 s.
+MAX_LOOP_LAG = 0.25
+
+
+class FakeRedis:
+    async def get(self, key):
+        return None
+
+    async def set(self, key, value, ex=None):
+        return True
+
+    def incr(self, key):
+        return 1
+
+
+@pytest.fixture
+def database():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        delegators = [
+            InitialDelegator(address=f"cosmos{i}", amount=100, is_participate=True, referral_token=f"token{i}")
+            for i in range(PARTICIPANTS)
+        ]
+        db.add_all(delegators)
+        db.add_all(Delegator(address=f"cosmos{i}", amount=100 + i) for i in range(PARTICIPANTS))
+        db.flush()
+        db.add_all(
+            Invitation(inviter_id=delegators[i].id, invitee_id=delegators[i + 1].id)
+            for i in range(0, PARTICIPANTS, 2)
+        )
+        lottery = Lottery(winners_count=3, start_at=datetime(2030, 1, 1), is_finished=False)
+        db.add(lottery)
+        db.flush()
+        rebuild_ticket_snapshot(db, lottery)
+        db.commit()
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    async def delegation(address):
+        await asyncio.sleep(LATENCY)
+        # Every other address changed its stake, so half of the requests write.
+        index = int(address.removeprefix("cosmos"))
+        return SimpleNamespace(balance=SimpleNamespace(amount=str((100 + index + index % 2) * 1_000_000)))
+
+    monkeypatch.setattr(general, "get_delegator_info_async", delegation)
+    monkeypatch.setattr(general, "async_redis_client", FakeRedis())
+    monkeypatch.setattr(general, "delegation_cache", TTLCache(maxsize=1000, ttl=60))
+    monkeypatch.setattr(response_cache, "redis_client", FakeRedis())
+
+
+async def measure_loop_lag(stop: asyncio.Event):
+    lag = 0.0
+    while not stop.is_set():
+        started = time.monotonic()
+        await asyncio.sleep(0.01)
+        lag = max(lag, time.monotonic() - started - 0.01)
+    return lag
+
+
+async def fire_requests():
+    engine = create_async_engine(make_url(TEST_DATABASE_URL).set(drivername="postgresql+asyncpg"))
+    sessions = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def get_test_db():
+        async with sessions() as db:
+            yield db
+
+    app.dependency_overrides[get_async_db] = get_test_db
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            # Warm up the app, the statement caches and a connection before measuring.
+            await client.get(f"/lottery/current/cosmos{PARTICIPANTS - 1}/info")
+            stop = asyncio.Event()
+            lag = asyncio.ensure_future(measure_loop_lag(stop))
+            started = time.monotonic()
+            responses = await asyncio.gather(*(
+                client.get(f"/lottery/current/cosmos{i}/info") for i in range(REQUESTS)
+            ))
+            elapsed = time.monotonic() - started
+            stop.set()
+            return responses, elapsed, await lag
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+
+def test_info_endpoint_keeps_the_loop_responsive(database, chain):
+    responses, elapsed, lag = asyncio.run(fire_requests())
+
+    assert [response.status_code for response in responses] == [200] * REQUESTS
+    for i, response in enumerate(responses):
+        assert response.json()["address_info"]["amount"] == 100 + i + i % 2
+
+    # Served one by one the chain lookups alone would take REQUESTS * LATENCY = 4 seconds.
+    assert elapsed < REQUESTS * LATENCY / 2
+    assert lag < MAX_LOOP_LAG
+
+    # The incremental snapshot refreshes of the writing requests add up to a full rebuild.
+    with Session(database) as db:
+        lottery = db.query(Lottery).one()
+        incremental = (lottery.total_tickets, lottery.participants_count, lottery.squared_tickets)
+        rebuild_ticket_snapshot(db, lottery)
+        assert (lottery.total_tickets, lottery.participants_count, lottery.squared_tickets) == incremental
+        db.rollback()
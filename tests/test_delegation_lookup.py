@@ -0,0 +1,73 @@
+import grpc
+import pytest
+import redis
+
+from app.services import general
+from app.services.cache import TTLCache
+
+
+class ChainError(grpc.RpcError):
+    def __init__(self, code):
+        self._code = code
+
+    def code(self):
+        return self._code
+
+
+class UnreachableRedis:
+    def get(self, key):
+        raise redis.ConnectionError("no redis in tests")
+
+    def set(self, *args, **kwargs):
+        raise redis.ConnectionError("no redis in tests")
+
+
+@pytest.fixture
+def chain(monkeypatch):
+    calls = []
+    answers = []
+
+    def call(service, method, request, **kwargs):
+        calls.append(request.delegator_addr)
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    monkeypatch.setattr(general.chain_pool, "call", call)
+    monkeypatch.setattr(general, "redis_client", UnreachableRedis())
+    monkeypatch.setattr(general, "delegation_cache", TTLCache(maxsize=10, ttl=60))
+    return calls, answers
+
+
+def test_not_found_is_cached_as_no_delegation(chain):
+    calls, answers = chain
+    answers.append(ChainError(grpc.StatusCode.NOT_FOUND))
+
+    assert general.get_delegation_amount("cosmos1") is None
+    assert general.get_delegation_amount("cosmos1") is None
+    assert calls == ["cosmos1"]
+
+
+def test_chain_failures_are_not_cached(chain):
+    calls, answers = chain
+    answers.append(ChainError(grpc.StatusCode.UNAVAILABLE))
+
+    class Response:
+        class delegation_response:
+            class balance:
+                amount = "2500000"
+
+    answers.append(Response())
+
+    assert general.get_delegation_amount("cosmos1") is None
+    assert general.get_delegation_amount("cosmos1") == 2_500_000
+    assert calls == ["cosmos1", "cosmos1"]
+
+
+def test_get_delegator_info_raises_other_errors(chain):
+    _, answers = chain
+    answers.append(ChainError(grpc.StatusCode.DEADLINE_EXCEEDED))
+
+    with pytest.raises(grpc.RpcError):
+        general.get_delegator_info("cosmos1")
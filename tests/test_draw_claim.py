@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import main
+from app.core.config import settings
+from app.db.database import get_db
+from app.main import app
+from app.tasks import tasks
+from tests.test_import_lock import FakeRedis
+
+TOKEN = {"x-token": settings.SECRET_KEY}
+
+
+class ActiveLottery:
+    def query(self, *args):
+        return self
+
+    def filter(self, *args):
+        return self
+
+    def first(self):
+        return SimpleNamespace(id=7)
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    monkeypatch.setattr(tasks, "redis_client", FakeRedis())
+    queued = []
+    monkeypatch.setattr(main, "run_lottery_draw",
+                        SimpleNamespace(apply_async=lambda task_id: queued.append(task_id)))
+    app.dependency_overrides[get_db] = lambda: ActiveLottery()
+    yield queued
+    app.dependency_overrides.clear()
+
+
+def test_repeated_draw_requests_queue_one_draw(queued):
+    client = TestClient(app)
+
+    first = client.post("/draw_lottery", headers=TOKEN).json()
+    second = client.post("/draw_lottery", headers=TOKEN).json()
+
+    assert first["message"] == "Lottery draw started"
+    assert second == {"message": "Lottery draw is already running", "task_id": first["task_id"]}
+    assert queued == [first["task_id"]]
+
+
+def test_scheduler_and_endpoint_share_the_claim(queued):
+    task_id = TestClient(app).post("/draw_lottery", headers=TOKEN).json()["task_id"]
+
+    assert tasks.claim_lottery_draw(7, "scheduled") == task_id
+    tasks.release_lottery_draw(7, task_id)
+    assert tasks.claim_lottery_draw(7, "scheduled") is None
+
+
+def test_failed_enqueue_releases_the_claim(queued, monkeypatch):
+    def broker_down(task_id):
+        raise ConnectionError("broker is down")
+
+    monkeypatch.setattr(main, "run_lottery_draw", SimpleNamespace(apply_async=broker_down))
+    client = TestClient(app, raise_server_exceptions=False)
+
+    assert client.post("/draw_lottery", headers=TOKEN).status_code == 500
+    assert tasks.claim_lottery_draw(7, "retry") is None
+
+
+def test_task_status_needs_the_admin_token():
+    client = TestClient(app)
+
+    assert client.get("/tasks/some-task").status_code == 422
+    assert client.get("/tasks/some-task", headers={"x-token": "wrong"}).status_code == 403
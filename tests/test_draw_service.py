@@ -0,0 +1,92 @@
+"""Distribution checks of the draw functions, with fixed seeds so every run samples the same draws."""
+import math
+import random
+from collections import Counter
+from itertools import permutations
+
+import pytest
+
+from app.services.draw_service import exact_prize_probability, pick_winners
+
+LEDGER = [("a", 1), ("b", 2), ("c", 3), ("d", 6)]
+TRIALS = 20_000
+
+
+def shuffle_draw(ledger, winners_count, rng):
+    """The draw ``pick_winners`` replaced: one entry per ticket, shuffled, first occurrences win."""
+    entries = [address for address, tickets in ledger for _ in range(tickets)]
+    rng.shuffle(entries)
+    return list(dict.fromkeys(entries))[:winners_count]
+
+
+def ordered_pair_chances(ledger):
+    """Exact chance of every (main winner, second winner) pair of the shuffle draw."""
+    tickets = dict(ledger)
+    total = sum(tickets.values())
+    return {
+        (first, second): tickets[first] / total * tickets[second] / (total - tickets[first])
+        for first, second in permutations(tickets, 2)
+    }
+
+
+def assert_matches(counts, chances, trials):
+    for outcome, chance in chances.items():
+        sigma = math.sqrt(trials * chance * (1 - chance))
+        assert abs(counts[outcome] - trials * chance) < 4 * sigma, (outcome, counts[outcome], trials * chance)
+
+
+def test_shuffle_reference_matches_the_exact_chances():
+    rng = random.Random(1)
+    counts = Counter(tuple(shuffle_draw(LEDGER, 2, rng)) for _ in range(TRIALS))
+    assert_matches(counts, ordered_pair_chances(LEDGER), TRIALS)
+
+
+def test_pick_winners_has_the_distribution_of_the_shuffle_draw():
+    counts = Counter(tuple(pick_winners(LEDGER, 2, f"seed{trial}")) for trial in range(TRIALS))
+    assert_matches(counts, ordered_pair_chances(LEDGER), TRIALS)
+
+
+def test_pick_winners_ignores_the_ledger_order():
+    shuffled = LEDGER[::-1] + [("e", 0)]
+    for trial in range(100):
+        assert pick_winners(shuffled, 3, f"seed{trial}") == pick_winners(LEDGER, 3, f"seed{trial}")
+
+
+@pytest.mark.parametrize("winners_count, expected", [(0, 0), (3, 3), (10, 4)])
+def test_pick_winners_returns_distinct_holders(winners_count, expected):
+    winners = pick_winners(LEDGER + [("e", 0)], winners_count, "seed")
+    assert len(winners) == len(set(winners)) == expected
+    assert "e" not in winners
+
+
+def others(ledger, address):
+    return [tickets for other, tickets in ledger if other != address]
+
+
+def test_exact_prize_probability_matches_the_pair_chances():
+    chances = ordered_pair_chances(LEDGER)
+    for address, tickets in LEDGER:
+        expected = sum(chance for pair, chance in chances.items() if address in pair)
+        assert exact_prize_probability(tickets, others(LEDGER, address), 2) == pytest.approx(expected, abs=1e-6)
+
+
+# Repeated ticket counts go through the grouped binomial, single ones through the plain update.
+HOLDERS = [(f"cosmos{i}", [1, 1, 2, 5, 5, 9, 30][i % 7]) for i in range(40)] + [("whale", 77)]
+
+
+def test_exact_prize_probabilities_add_up_to_the_winners_count():
+    chances = [exact_prize_probability(tickets, others(HOLDERS, address), 4) for address, tickets in HOLDERS]
+    assert sum(chances) == pytest.approx(4, abs=1e-5)
+
+
+def test_exact_prize_probability_matches_pick_winners():
+    counts = Counter(address for trial in range(TRIALS) for address in pick_winners(HOLDERS, 4, f"seed{trial}"))
+    for address, tickets in HOLDERS[:7] + HOLDERS[-1:]:
+        chance = exact_prize_probability(tickets, others(HOLDERS, address), 4)
+        assert_matches(counts, {address: chance}, TRIALS)
+
+
+def test_exact_prize_probability_edge_cases():
+    assert exact_prize_probability(0, [1, 2], 1) == 0.0
+    assert exact_prize_probability(3, [1, 2], 0) == 0.0
+    assert exact_prize_probability(1, [5, 0, 7], 3) == 1.0
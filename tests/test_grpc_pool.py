@@ -0,0 +1,226 @@
+"""ChainClientPool and the delegations pager against an in-process fake of the staking query service."""
+import asyncio
+import threading
+import time
+from concurrent import futures
+
+import grpc
+import pytest
+from cosmpy.aerial.client import LedgerClient  # noqa: F401 - loads protobuf before cosmpy.protos extends sys.path
+from cosmpy.protos.cosmos.staking.v1beta1 import query_pb2, query_pb2_grpc
+
+from app.services import general, grpc_pool
+from app.services.grpc_pool import AsyncChainClientPool, ChainClientPool
+
+
+class FakeStaking(query_pb2_grpc.QueryServicer):
+    """Answers ``Delegation`` after ``delay`` seconds and records peers and concurrency.
+
+    ``ValidatorDelegations`` pages through ``delegators`` with the offset as page key and
+    records the key, limit and block height metadata of every request.
+    """
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.peers = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.delegators = [f"cosmos{i}" for i in range(7)]
+        self.page_requests = []
+
+    def Delegation(self, request, context):
+        with self.lock:
+            self.peers.append(context.peer())
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            time.sleep(self.delay)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+        response = query_pb2.QueryDelegationResponse()
+        response.delegation_response.balance.denom = "uatom"
+        response.delegation_response.balance.amount = "1000000"
+        return response
+
+    def ValidatorDelegations(self, request, context):
+        metadata = dict(context.invocation_metadata())
+        with self.lock:
+            self.page_requests.append({
+                "key": request.pagination.key,
+                "limit": request.pagination.limit,
+                "height": metadata.get("x-cosmos-block-height"),
+            })
+        time.sleep(self.delay)
+
+        offset = int(request.pagination.key or b"0")
+        end = offset + request.pagination.limit
+        response = query_pb2.QueryValidatorDelegationsResponse()
+        for address in self.delegators[offset:end]:
+            delegation = response.delegation_responses.add()
+            delegation.delegation.delegator_address = address
+            delegation.balance.amount = "1000000"
+        if end < len(self.delegators):
+            response.pagination.next_key = str(end).encode()
+        return response
+
+
+@pytest.fixture
+def staking():
+    servicer = FakeStaking()
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16))
+    query_pb2_grpc.add_QueryServicer_to_server(servicer, server)
+    port = server.add_insecure_port("127.0.0.1:0")
+    server.start()
+    servicer.url = f"grpc+http://127.0.0.1:{port}"
+    yield servicer
+    server.stop(None)
+
+
+def make_pool(url, size=2, max_in_flight=4, timeout=5.0):
+    return ChainClientPool(url=url, size=size, max_in_flight=max_in_flight, timeout=timeout, keepalive_ms=300_000)
+
+
+def delegation_request():
+    return query_pb2.QueryDelegationRequest(delegator_addr="cosmos1", validator_addr="cosmosvaloper1")
+
+
+def test_calls_are_spread_round_robin(staking):
+    pool = make_pool(staking.url, size=2)
+    try:
+        for _ in range(6):
+            response = pool.call("staking", "Delegation", delegation_request())
+            assert response.delegation_response.balance.amount == "1000000"
+    finally:
+        pool.close()
+
+    # One connection per channel: the peers alternate between two client ports.
+    assert len(set(staking.peers)) == 2
+    assert staking.peers[0::2] == [staking.peers[0]] * 3
+    assert staking.peers[1::2] == [staking.peers[1]] * 3
+    assert pool.metrics()["calls"] == 6
+
+
+def test_in_flight_calls_are_bounded(staking):
+    staking.delay = 0.2
+    pool = make_pool(staking.url, size=2, max_in_flight=2)
+    try:
+        with futures.ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(
+                lambda _: pool.call("staking", "Delegation", delegation_request()), range(6)
+            ))
+        metrics = pool.metrics()
+    finally:
+        pool.close()
+
+    assert len(results) == 6
+    assert staking.peak_in_flight == 2
+    assert metrics["peak_in_flight"] == 2
+    assert metrics["in_flight"] == 0
+
+
+def test_saturated_pool_rejects_after_timeout(staking):
+    staking.delay = 0.5
+    pool = make_pool(staking.url, size=1, max_in_flight=1, timeout=0.1)
+    try:
+        with futures.ThreadPoolExecutor(max_workers=1) as executor:
+            running = executor.submit(pool.call, "staking", "Delegation", delegation_request(), timeout=2.0)
+            while staking.in_flight == 0:
+                time.sleep(0.01)
+            with pytest.raises(TimeoutError):
+                pool.call("staking", "Delegation", delegation_request())
+            running.result()
+        assert pool.metrics()["rejected"] == 1
+    finally:
+        pool.close()
+
+
+def test_channels_are_rebuilt_after_fork(staking, monkeypatch):
+    pool = make_pool(staking.url, size=2)
+    try:
+        pool.call("staking", "Delegation", delegation_request())
+        parent_channels = list(pool._channels)
+
+        child_pid = grpc_pool.os.getpid() + 1
+        monkeypatch.setattr(grpc_pool.os, "getpid", lambda: child_pid)
+        pool.call("staking", "Delegation", delegation_request())
+
+        assert len(pool._channels) == 2
+        assert not set(map(id, pool._channels)) & set(map(id, parent_channels))
+    finally:
+        pool.close()
+
+
+def test_async_pool_closes_channels_of_a_previous_loop(staking):
+    pool = AsyncChainClientPool(url=staking.url, size=2, max_in_flight=4, timeout=5.0, keepalive_ms=300_000)
+
+    async def call():
+        response = await pool.call("staking", "Delegation", delegation_request())
+        return response, list(pool._channels)
+
+    first_response, first_channels = asyncio.run(call())
+    second_response, second_channels = asyncio.run(call())
+    asyncio.run(pool.close())
+
+    assert first_response.delegation_response.balance.amount == "1000000"
+    assert second_response.delegation_response.balance.amount == "1000000"
+    assert all(channel._channel.closed() for channel in first_channels)
+    assert not set(map(id, second_channels)) & set(map(id, first_channels))
+
+
+def test_keepalive_respects_the_default_server_policy():
+    options = dict(grpc_pool.channel_options(grpc_pool.settings.GRPC_KEEPALIVE_MS))
+
+    assert options["grpc.keepalive_time_ms"] >= 300_000
+    assert options["grpc.keepalive_permit_without_calls"] == 0
+
+
+@pytest.fixture
+def pager(staking, monkeypatch):
+    pool = make_pool(staking.url)
+    monkeypatch.setattr(general, "chain_pool", pool)
+    yield staking
+    pool.close()
+
+
+def page_addresses(page):
+    return [response.delegation.delegator_address for response in page.delegation_responses]
+
+
+def test_pager_follows_next_key_in_order(pager):
+    pages = [page_addresses(page) for page in general.iter_delegator_pages(page_size=3)]
+
+    assert pages == [["cosmos0", "cosmos1", "cosmos2"], ["cosmos3", "cosmos4", "cosmos5"], ["cosmos6"]]
+    assert [request["key"] for request in pager.page_requests] == [b"", b"3", b"6"]
+    assert {request["limit"] for request in pager.page_requests} == {3}
+
+
+def test_pager_resumes_from_start_key(pager):
+    pages = [page_addresses(page) for page in general.iter_delegator_pages(page_size=3, start_key=b"3")]
+
+    assert pages == [["cosmos3", "cosmos4", "cosmos5"], ["cosmos6"]]
+    assert pager.page_requests[0]["key"] == b"3"
+
+
+def test_pager_pins_every_page_to_the_height(pager):
+    list(general.iter_delegator_pages(page_size=3, height=1234))
+    assert [request["height"] for request in pager.page_requests] == ["1234"] * 3
+
+    pager.page_requests.clear()
+    list(general.iter_delegator_pages(page_size=3))
+    assert [request["height"] for request in pager.page_requests] == [None] * 3
+
+
+def test_pager_requests_the_next_page_while_the_consumer_holds_one(pager):
+    pager.delay = 0.05
+    pages = general.iter_delegator_pages(page_size=3)
+
+    for number, page in enumerate(pages, start=1):
+        # Page ``number`` is with the consumer; the request for the next one is already out.
+        deadline = time.monotonic() + 2.0
+        expected = min(number + 1, 3)
+        while len(pager.page_requests) < expected and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(pager.page_requests) == expected
+    assert number == 3
@@ -0,0 +1,183 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+import redis as redis_lib
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+from app.db.models import InitialDelegator, Invitation, Lottery
+from app.services import idempotency, initial_delegator_service
+from app.services.ticket_snapshot_service import rebuild_ticket_snapshot
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+class FakeRedis:
+    """Thread-safe subset of the Redis client used by run_idempotent."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.ttls = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        with self.lock:
+            if nx and key in self.values:
+                return None
+            self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+            self.ttls[key] = ex
+            return True
+
+    def get(self, key):
+        with self.lock:
+            return self.values.get(key)
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+            self.ttls.pop(key, None)
+
+
+@pytest.fixture
+def redis(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(idempotency, "redis_client", fake)
+    return fake
+
+
+def test_concurrent_duplicates_run_once(redis):
+    calls = []
+    started = threading.Event()
+
+    def register():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return {"address": "cosmos1", "is_participate": True}
+
+    outcomes = []
+
+    def request():
+        try:
+            outcomes.append(idempotency.run_idempotent("participate:cosmos1", "key", register))
+        except HTTPException as e:
+            outcomes.append(e.status_code)
+
+    first = threading.Thread(target=request)
+    first.start()
+    started.wait()
+    duplicates = [threading.Thread(target=request) for _ in range(5)]
+    for thread in duplicates:
+        thread.start()
+    for thread in [first, *duplicates]:
+        thread.join()
+
+    assert len(calls) == 1
+    assert outcomes.count(409) == 5
+    assert {"address": "cosmos1", "is_participate": True} in outcomes
+    assert idempotency.run_idempotent("participate:cosmos1", "key", register) == \
+        {"address": "cosmos1", "is_participate": True}
+    assert len(calls) == 1
+
+
+def test_in_progress_marker_is_short_lived(redis):
+    seen = {}
+
+    def register():
+        seen.update(redis.ttls)
+        return {"ok": True}
+
+    idempotency.run_idempotent("participate:cosmos1", "key", register)
+
+    key = "idempotency:participate:cosmos1:key"
+    assert seen[key] == idempotency.IN_PROGRESS_TTL
+    assert redis.ttls[key] == idempotency.IDEMPOTENCY_TTL
+
+
+def test_failure_releases_the_key(redis):
+    def fail():
+        raise HTTPException(status_code=400, detail="Invalid referral code")
+
+    with pytest.raises(HTTPException):
+        idempotency.run_idempotent("participate:cosmos1", "key", fail)
+
+    assert idempotency.run_idempotent("participate:cosmos1", "key", lambda: {"ok": True}) == {"ok": True}
+
+
+def test_redis_outage_runs_the_request(monkeypatch):
+    class DownRedis:
+        def __getattr__(self, name):
+            def fail(*args, **kwargs):
+                raise redis_lib.ConnectionError("Redis is down")
+            return fail
+
+    monkeypatch.setattr(idempotency, "redis_client", DownRedis())
+
+    assert idempotency.run_idempotent("participate:cosmos1", "key", lambda: {"ok": True}) == {"ok": True}
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setattr(initial_delegator_service, "bump_data_version", lambda: None)
+    engine = create_engine(TEST_DATABASE_URL, pool_size=20)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(InitialDelegator(address="inviter", amount=100, is_participate=True, referral_token="ref"))
+        # Imported delegators that have not joined yet; odd addresses are new.
+        db.add_all(InitialDelegator(address=f"cosmos{i}", amount=50) for i in range(0, 10, 2))
+        db.add(InitialDelegator(address="cosmos1", amount=50))
+        lottery = Lottery(winners_count=3, start_at=datetime(2030, 1, 1), is_finished=False)
+        db.add(lottery)
+        db.flush()
+        rebuild_ticket_snapshot(db, lottery)
+        db.commit()
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+def test_concurrent_participates_against_the_database(database):
+    duplicates = 8
+    addresses = ["cosmos1"] * duplicates + [f"cosmos{i}" for i in range(2, 10)]
+    barrier = threading.Barrier(len(addresses))
+
+    def request(address):
+        with Session(database) as db:
+            barrier.wait()
+            try:
+                return initial_delegator_service.participate(db, address, "ref").address
+            except HTTPException as e:
+                return e.status_code
+
+    with ThreadPoolExecutor(max_workers=len(addresses)) as executor:
+        outcomes = list(executor.map(request, addresses))
+
+    assert outcomes[:duplicates].count("cosmos1") == 1
+    assert outcomes[:duplicates].count(403) == duplicates - 1
+    assert outcomes[duplicates:] == addresses[duplicates:]
+
+    with Session(database) as db:
+        participants = db.query(InitialDelegator).filter_by(is_participate=True).all()
+        tokens = [delegator.referral_token for delegator in participants]
+        invitees = [invitation.invitee_id for invitation in db.query(Invitation)]
+        cosmos1 = db.query(InitialDelegator.id).filter_by(address="cosmos1").scalar()
+
+        lottery = db.query(Lottery).one()
+        incremental = (lottery.total_tickets, lottery.participants_count, lottery.squared_tickets)
+        rebuild_ticket_snapshot(db, lottery)
+        rebuilt = (lottery.total_tickets, lottery.participants_count, lottery.squared_tickets)
+        db.rollback()
+
+    assert len(participants) == 1 + len(set(addresses))
+    assert None not in tokens and len(set(tokens)) == len(tokens)
+    assert invitees.count(cosmos1) == 1
+    assert len(invitees) == len(set(addresses))
+    assert incremental == rebuilt
@@ -0,0 +1,94 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.db.database import get_db
+from app import main
+from app.main import app
+from app.services import initial_delegator_service
+from app.tasks import tasks
+
+
+class FakeRedis:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        with self.lock:
+            if nx and key in self.values:
+                return None
+            self.values[key] = value.encode() if isinstance(value, str) else value
+            return True
+
+    def get(self, key):
+        with self.lock:
+            return self.values.get(key)
+
+    def expire(self, key, seconds):
+        return key in self.values
+
+    def delete(self, key):
+        with self.lock:
+            self.values.pop(key, None)
+
+
+class EmptyTable:
+    def query(self, *args):
+        return self
+
+    def count(self):
+        return 0
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def queued(monkeypatch):
+    monkeypatch.setattr(initial_delegator_service, "redis_client", FakeRedis())
+    queued = []
+    monkeypatch.setattr(main, "populate_initial_delegators",
+                        SimpleNamespace(apply_async=lambda task_id: queued.append(task_id)))
+    app.dependency_overrides[get_db] = lambda: EmptyTable()
+    yield queued
+    app.dependency_overrides.clear()
+
+
+def test_second_caller_gets_the_running_task(queued):
+    client = TestClient(app)
+
+    first = client.post("/populate-initial-delegators").json()
+    second = client.post("/populate-initial-delegators").json()
+
+    assert first["message"] == "Delegators import started"
+    assert second == {"message": "Delegators import is already running", "task_id": first["task_id"]}
+    assert queued == [first["task_id"]]
+
+
+def test_task_without_the_lock_does_not_import(queued, monkeypatch):
+    client = TestClient(app)
+    running = client.post("/populate-initial-delegators").json()["task_id"]
+    monkeypatch.setattr(tasks, "fetch_delegators_data", lambda *args, **kwargs: pytest.fail("imported twice"))
+
+    result = tasks.populate_initial_delegators.apply(task_id="another").get()
+
+    assert result == {"running_task_id": running}
+
+
+def test_lock_is_released_when_the_import_ends(queued, monkeypatch):
+    client = TestClient(app)
+    task_id = client.post("/populate-initial-delegators").json()["task_id"]
+    monkeypatch.setattr(tasks, "SessionLocal", EmptyTable)
+    monkeypatch.setattr(tasks, "fetch_delegators_data", lambda db, on_progress: {"imported": 0})
+
+    assert tasks.populate_initial_delegators.apply(task_id=task_id).get() == {"imported": 0}
+
+    restarted = client.post("/populate-initial-delegators").json()
+    assert restarted["message"] == "Delegators import started"
+    assert restarted["task_id"] != task_id
@@ -0,0 +1,170 @@
+"""EXPLAIN the hot queries on a seeded PostgreSQL database and fail on plans that scan.
+
+Runs against a scratch database given by ``TEST_DATABASE_URL`` and is skipped without it.
+The tables are seeded with 60k delegators, 20k invitations and snapshots of three
+lotteries, then ANALYZEd. Sequential scans stay enabled, so a missing or unusable index
+shows up as the scan the planner would really choose. ``lotteries`` and ``winners`` grow
+by one row and a few rows per draw, where a sequential scan is the right plan, so their
+lookups are not checked.
+"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, insert, select, text, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+from app.db.models import Delegator, InitialDelegator, Invitation, Lottery, TicketSnapshot, Winner
+from app.services.delegator_service import stakers_ranking_query
+from app.services.invitation_service import invitation_ranking_query
+from app.services.lottery_service import other_holder_tickets_query, ticket_ledger_query
+from app.services.ticket_query import ticket_components_query, ticket_totals_query
+from app.services.ticket_snapshot_service import rebuild_ticket_snapshot, ranked_neighbours_query, \
+    ranked_page_query
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+DELEGATORS = 60_000
+SMALL_LOTTERY_HOLDERS = 150
+
+SEED = f"""
+INSERT INTO initial_delegators (address, amount, is_participate, referral_token)
+SELECT 'cosmos' || lpad(i::text, 6, '0'), (i::bigint * 7919) % 5000, i % 2 = 0, 'token' || i
+FROM generate_series(1, {DELEGATORS}) AS i;
+
+INSERT INTO delegators (address, amount)
+SELECT 'cosmos' || lpad(i::text, 6, '0'), (i::bigint * 104729) % 9000
+FROM generate_series(1, {DELEGATORS}) AS i;
+
+INSERT INTO invitations (inviter_id, invitee_id)
+SELECT (i * 31) % ({DELEGATORS} / 2) * 2 + 2, i
+FROM generate_series(1, {DELEGATORS}, 3) AS i
+WHERE (i * 31) % ({DELEGATORS} / 2) * 2 + 2 <> i;
+"""
+
+ADDRESS = "cosmos000002"
+
+
+@pytest.fixture(scope="module")
+def db():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    session = Session(engine)
+    session.execute(text(SEED))
+
+    past = Lottery(winners_count=10, start_at=datetime(2029, 1, 1), is_finished=True)
+    small = Lottery(winners_count=3, start_at=datetime(2029, 6, 1), is_finished=True,
+                    ticket_snapshot_at=datetime(2029, 5, 1))
+    active = Lottery(winners_count=10, start_at=datetime(2030, 1, 1), is_finished=False)
+    session.add_all([past, small, active])
+    session.flush()
+    rebuild_ticket_snapshot(session, past)
+    rebuild_ticket_snapshot(session, active)
+    past_rows = select(TicketSnapshot).where(TicketSnapshot.lottery_id == past.id).limit(SMALL_LOTTERY_HOLDERS)
+    session.execute(insert(TicketSnapshot).values([
+        {**{column.key: getattr(row, column.key) for column in TicketSnapshot.__table__.columns}, "lottery_id": small.id}
+        for row in session.scalars(past_rows)
+    ]))
+    session.execute(insert(Winner).values([
+        {"lottery_id": past.id, "initial_delegator_id": i * 97, "is_main": i == 1} for i in range(1, 11)
+    ]))
+    session.commit()
+    session.execute(text("ANALYZE"))
+    session.commit()
+
+    session.info.update(active=active.id, small=small.id)
+    yield session
+    session.close()
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def live(db):
+    """The active lottery before its first snapshot: ticket rows are computed from the source tables."""
+    db.execute(update(Lottery).where(Lottery.id == db.info["active"]).values(ticket_snapshot_at=None))
+    yield db
+    db.rollback()
+
+
+@pytest.fixture
+def small_lottery(db):
+    """A lottery below PRIZE_PROBABILITY_EXACT_LIMIT holders, next to the large snapshots of others."""
+    db.execute(update(Lottery).where(Lottery.id == db.info["active"]).values(is_finished=True))
+    db.execute(update(Lottery).where(Lottery.id == db.info["small"]).values(is_finished=False))
+    yield db
+    db.rollback()
+
+
+def plan(db: Session, query) -> dict:
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+
+
+def nodes(node: dict):
+    yield node
+    for child in node.get("Plans", []):
+        yield from nodes(child)
+
+
+def seq_scans(node: dict):
+    return [child["Relation Name"] for child in nodes(node) if child["Node Type"] == "Seq Scan"]
+
+
+def looped_seq_scans(node: dict):
+    """Tables scanned sequentially on the inner side of a nested loop, i.e. once per outer row."""
+    return [
+        table
+        for loop in nodes(node) if loop["Node Type"] == "Nested Loop"
+        for table in seq_scans(loop["Plans"][1])
+    ]
+
+
+INDEXED_QUERIES = {
+    "initial delegator by address": lambda db: select(InitialDelegator).where(InitialDelegator.address == ADDRESS),
+    "initial delegator by referral token": lambda db: select(InitialDelegator).where(
+        InitialDelegator.referral_token == "token2"),
+    "delegator by address": lambda db: select(Delegator).where(Delegator.address == ADDRESS),
+    "invitations of an inviter": lambda db: select(Invitation).where(Invitation.inviter_id == 2),
+    "invitation of an invitee": lambda db: select(Invitation).where(Invitation.invitee_id == 2),
+    "snapshot rows of addresses": lambda db: select(TicketSnapshot).where(
+        TicketSnapshot.lottery_id == db.info["active"], TicketSnapshot.address.in_([ADDRESS, "cosmos000004"])),
+    "live ticket rows of an address": lambda db: ticket_components_query([ADDRESS]),
+    "stakers ranking page": lambda db: ranked_page_query(stakers_ranking_query(db), 40, 20),
+    "stakers ranking neighbours": lambda db: ranked_neighbours_query(stakers_ranking_query(db), ADDRESS, 5),
+    "inviters ranking page": lambda db: ranked_page_query(invitation_ranking_query(db), 40, 20),
+    "inviters ranking neighbours": lambda db: ranked_neighbours_query(invitation_ranking_query(db), ADDRESS, 5),
+    "ticket ledger page": lambda db: ticket_ledger_query(db, after=ADDRESS, limit=100),
+}
+
+
+@pytest.mark.parametrize("name", INDEXED_QUERIES)
+def test_hot_query_uses_an_index(db, name):
+    explained = plan(db, INDEXED_QUERIES[name](db))
+    assert not seq_scans(explained), f"{name} needs a sequential scan:\n{explained}"
+
+
+def test_other_holders_of_a_small_lottery_use_an_index(small_lottery):
+    explained = plan(small_lottery, other_holder_tickets_query(small_lottery, ADDRESS))
+    assert not seq_scans(explained), explained
+
+
+LIVE_QUERIES = {
+    "stakers ranking page": lambda db: ranked_page_query(stakers_ranking_query(db), 40, 20),
+    "inviters ranking page": lambda db: ranked_page_query(invitation_ranking_query(db), 40, 20),
+    "ticket ledger page": lambda db: ticket_ledger_query(db, after=ADDRESS, limit=100),
+    "ticket totals": lambda db: ticket_totals_query(),
+    "other holders": lambda db: other_holder_tickets_query(db, ADDRESS),
+}
+
+
+@pytest.mark.parametrize("name", LIVE_QUERIES)
+def test_live_ticket_query_scans_each_table_once(live, name):
+    # Without a snapshot these read every participant; the joins must hash, not rescan.
+    explained = plan(live, LIVE_QUERIES[name](live))
+    assert not looped_seq_scans(explained), f"{name} rescans a table per row:\n{explained}"
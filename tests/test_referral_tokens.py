@@ -0,0 +1,53 @@
+"""Derived referral tokens are a keyed bijection from delegator ids onto six-character tokens."""
+import pytest
+
+from app.services import referral_tokens
+from app.services.referral_tokens import ALPHABET, HALF_BITS, HALF_MASK, ROUNDS, TOKEN_LENGTH, TOKEN_SPACE, \
+    permute, referral_token_for, round_function
+
+IDS = list(range(10_000)) + list(range(TOKEN_SPACE - 1_000, TOKEN_SPACE))
+
+
+def unpermute(value: int, tweak: int) -> int:
+    left, right = value >> HALF_BITS, value & HALF_MASK
+    for round_index in reversed(range(ROUNDS)):
+        left, right = right ^ round_function(tweak, round_index, left), left
+    return (left << HALF_BITS) | right
+
+
+def decode(token: str) -> int:
+    value = 0
+    for char in token:
+        value = value * len(ALPHABET) + ALPHABET.index(char)
+    return value
+
+
+def delegator_id_for(token: str, tweak: int) -> int:
+    """Walk the permutation backwards until it lands in the token space again."""
+    value = unpermute(decode(token), tweak)
+    while value >= TOKEN_SPACE:
+        value = unpermute(value, tweak)
+    return value
+
+
+@pytest.mark.parametrize("tweak", [0, 1, 2])
+def test_tokens_are_distinct_and_map_back_to_their_id(tweak):
+    tokens = [referral_token_for(delegator_id, tweak) for delegator_id in IDS]
+
+    assert len(set(tokens)) == len(IDS)
+    assert all(len(token) == TOKEN_LENGTH and set(token) <= set(ALPHABET) for token in tokens)
+    assert [delegator_id_for(token, tweak) for token in tokens] == IDS
+
+
+def test_feistel_permutation_is_invertible():
+    for value in list(range(1_000)) + [(1 << 2 * HALF_BITS) - 1, 1 << HALF_BITS]:
+        assert unpermute(permute(value, 0), 0) == value
+        assert permute(value, 0) < 1 << 2 * HALF_BITS
+
+
+def test_tweaks_and_keys_give_different_tokens(monkeypatch):
+    tokens = [referral_token_for(delegator_id) for delegator_id in range(1_000)]
+
+    assert sum(token == referral_token_for(i, tweak=1) for i, token in enumerate(tokens)) <= 1
+    monkeypatch.setattr(referral_tokens, "KEY", b"another secret")
+    assert sum(token == referral_token_for(i) for i, token in enumerate(tokens)) <= 1
@@ -0,0 +1,106 @@
+"""Locking of snapshot refreshes and rebuilds on PostgreSQL.
+
+One session holds the locks of a refresh or rebuild in an open transaction while a second
+session tries its own under a short ``lock_timeout``. Skipped without ``TEST_DATABASE_URL``.
+"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, select, text, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+from app.db.database import Base
+from app.db.models import Delegator, InitialDelegator, Invitation, Lottery
+from app.services.ticket_snapshot_service import SNAPSHOT_LOCK, lock_addresses, rebuild_ticket_snapshot, \
+    refresh_ticket_snapshot
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine(TEST_DATABASE_URL)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        delegators = [
+            InitialDelegator(address=f"cosmos{i}", amount=100, is_participate=True, referral_token=f"token{i}")
+            for i in range(4)
+        ]
+        db.add_all(delegators)
+        db.add_all(Delegator(address=f"cosmos{i}", amount=100) for i in range(4))
+        db.flush()
+        # cosmos0 invited cosmos1; cosmos2 and cosmos3 are unrelated.
+        db.add(Invitation(inviter_id=delegators[0].id, invitee_id=delegators[1].id))
+        lottery = Lottery(winners_count=1, start_at=datetime(2030, 1, 1), is_finished=False)
+        db.add(lottery)
+        db.flush()
+        rebuild_ticket_snapshot(db, lottery)
+        db.commit()
+    yield engine
+    Base.metadata.drop_all(engine)
+    engine.dispose()
+
+
+def change_amount(db: Session, address: str, amount: int):
+    db.execute(update(Delegator).where(Delegator.address == address).values(amount=amount))
+    refresh_ticket_snapshot(db, address)
+
+
+def blocked(engine, action) -> bool:
+    with Session(engine) as db:
+        db.execute(text("SET LOCAL lock_timeout = '200ms'"))
+        try:
+            action(db)
+        except OperationalError:
+            return True
+        db.commit()
+        return False
+
+
+def hold_refresh_locks(db: Session, addresses):
+    """The locks a refresh holds while it recomputes rows, before its closing update of the totals."""
+    lottery_id = db.scalar(select(Lottery.id))
+    db.execute(select(func.pg_advisory_xact_lock_shared(SNAPSHOT_LOCK, lottery_id)))
+    lock_addresses(db, addresses)
+
+
+def test_refreshes_of_unrelated_addresses_do_not_wait(engine):
+    with Session(engine) as holder:
+        hold_refresh_locks(holder, ["cosmos1", "cosmos0"])
+
+        assert not blocked(engine, lambda db: change_amount(db, "cosmos2", 120))
+        # cosmos0 is the inviter of cosmos1, so a change to either recomputes both rows.
+        assert blocked(engine, lambda db: change_amount(db, "cosmos0", 130))
+        assert blocked(engine, lambda db: change_amount(db, "cosmos1", 160))
+        holder.rollback()
+
+
+def test_rebuild_waits_for_refreshes_and_holds_them_off(engine):
+    with Session(engine) as holder:
+        change_amount(holder, "cosmos1", 150)
+        assert blocked(engine, lambda db: rebuild_ticket_snapshot(db, db.query(Lottery).one()))
+        holder.commit()
+
+    with Session(engine) as holder:
+        rebuild_ticket_snapshot(holder, holder.query(Lottery).one())
+        assert blocked(engine, lambda db: change_amount(db, "cosmos3", 120))
+        holder.commit()
+
+
+def test_refreshes_add_up_to_a_rebuild(engine):
+    for address, amount in [("cosmos1", 150), ("cosmos2", 120), ("cosmos0", 300), ("cosmos3", 0)]:
+        with Session(engine) as db:
+            change_amount(db, address, amount)
+            db.commit()
+
+    with Session(engine) as db:
+        lottery = db.query(Lottery).one()
+        incremental = (lottery.total_tickets, lottery.participants_count, lottery.squared_tickets)
+        rebuild_ticket_snapshot(db, lottery)
+        assert (lottery.total_tickets, lottery.participants_count, lottery.squared_tickets) == incremental
+        db.rollback()